@@ -0,0 +1,308 @@
+"""Benchmark the per-frame pipeline stage by stage.
+
+Runs every built-in level plus synthetic stress levels with scripted input
+and reports p50/p95/p99 times per stage as JSON, so runs from different
+commits can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import argparse
+import time
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+
+# Draw into an off-screen display unless a real one was asked for
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+import tutorial
+from tutorial import (World, FrameTimer, KeyState, LevelObjects, Block, Enemy, ProjectileStore,
+                      Fruit, Fire, Checkpoint, Projectile, GameState, AssetCache, AssetLoader,
+                      WIDTH, HEIGHT, draw, get_background, seed_rng)
+
+STAGES = ["streaming", "objects", "enemies_projectiles", "player_loop", "fire_loop", "handle_move", "draw"]
+
+# Entities built per kind when measuring memory
+MEMORY_ENTITIES = 10000
+ENTITY_KINDS = {
+    "block": lambda i: Block(i * 96, HEIGHT - 96, 96),
+    "fruit": lambda i: Fruit(i * 64, 500),
+    "enemy": lambda i: Enemy(i * 64, 664, 40, 40, "walker"),
+    "fire": lambda i: Fire(i * 64, 640, 16, 32),
+    "checkpoint": lambda i: Checkpoint(i * 64, 600),
+    "projectile": lambda i: Projectile(i * 16, 300, 1),
+}
+
+# (blocks, enemies, projectiles) for the synthetic stress levels
+STRESS_LEVELS = [(1000, 50, 50), (10000, 500, 500), (1000, 50, 5000)]
+
+def scripted_input(tick):
+    """Run right in bursts, jumping and dashing on a fixed rhythm."""
+    phase = tick % 240
+    return {
+        "left": 180 <= phase < 210,
+        "right": phase < 150,
+        "jump": tick % 45 == 0,
+        "dash": tick % 120 == 60,
+    }
+
+def create_stress_level(blocks, enemies, projectiles):
+    block_size = 96
+    objects = []
+    # Long floor with a platform every few tiles
+    for i in range(-WIDTH // block_size, blocks - blocks // 4):
+        objects.append(Block(i * block_size, HEIGHT - block_size, block_size))
+    for i in range(blocks // 4):
+        objects.append(Block(i * 4 * block_size, HEIGHT - block_size * (3 + i % 3), block_size))
+
+    spacing = max(1, (blocks * block_size) // max(1, enemies))
+    enemy_types = ["walker", "shooter", "jumper"]
+    for i in range(enemies):
+        objects.append(Enemy(600 + i * spacing, HEIGHT - block_size - 40, 40, 40, enemy_types[i % 3]))
+        objects.append(Fruit(600 + i * spacing, HEIGHT - block_size * 2))
+    return LevelObjects(objects, block_size), top_up_projectiles(ProjectileStore(capacity=max(projectiles, ProjectileStore.CAPACITY)), projectiles)
+
+def top_up_projectiles(projectiles, count):
+    """Keep the projectile count steady; off-screen ones are culled each tick."""
+    i = len(projectiles)
+    while len(projectiles) < count:
+        direction = 1 if i % 2 else -1
+        projectiles.spawn((i * 37) % WIDTH, 100 + (i * 53) % (HEIGHT - 200), direction)
+        i += 1
+    return projectiles
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+    }
+
+def run_scenario(window, background, level=None, stress=None, ticks=600, render=True,
+                 collision=World.collision, substep=World.substep):
+    seed_rng(0)
+    world = World()
+    world.collision = collision
+    world.substep = substep
+    if level is not None:
+        world.start_level(level)
+    else:
+        world.start_level(1)
+        world.objects, world.projectiles = create_stress_level(*stress)
+
+    timer = FrameTimer()
+    world.timer = timer
+    frames = []
+    counters = {}
+    for tick in range(ticks):
+        # Keep the run going: no game over, and restart the level at the exit
+        game_state = world.game_state
+        game_state.lives = game_state.health = game_state.max_health
+        if game_state.state != GameState.PLAYING:
+            game_state.state = GameState.PLAYING
+            world.player.rect.topleft = (100, 100)
+        if stress is not None:
+            top_up_projectiles(world.projectiles, stress[2])
+
+        inputs = scripted_input(tick)
+        if inputs["jump"]:
+            world.handle_key(pygame.K_SPACE)
+        if inputs["dash"]:
+            world.handle_key(pygame.K_x)
+
+        timer.begin_frame()
+        world.step(KeyState({pygame.K_LEFT: inputs["left"], pygame.K_RIGHT: inputs["right"]}))
+        if render:
+            timer.start()
+            draw(window, background, world.player, world.objects, world.projectiles,
+                 world.offset_x, world.game_state)
+            timer.mark("draw")
+        report = timer.end_frame()
+        frames.append(report["frame_ms"] / 1000)
+        for name, count in report["counters"].items():
+            counters[name] = counters.get(name, 0) + count
+
+    return {
+        "objects": len(world.objects),
+        "projectiles": len(world.projectiles),
+        "pools": {"projectiles": world.projectiles.pool.stats},
+        "ticks": ticks,
+        "stages": {stage: summarize(timer.samples.get(stage, [])) for stage in STAGES},
+        "frame": summarize(frames),
+        "per_tick": {name: total / ticks for name, total in counters.items()},
+    }
+
+def entity_memory(count=MEMORY_ENTITIES):
+    """Heap bytes per entity of each kind, traced while building count of them.
+
+    Images and masks shared between entities are built before tracing
+    starts, so this is what each extra entity costs.
+    """
+    results = {}
+    for kind, make in ENTITY_KINDS.items():
+        make(0)
+        entities = [None] * count
+        tracemalloc.start()
+        for i in range(count):
+            entities[i] = make(i)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[kind] = size / count
+    return results
+
+def asset_loading(cache_dir):
+    """Time to load every preloaded asset into an empty cache, blocking and in the background.
+
+    preload_ms slices every sheet file by file and atlas_preload_ms reads
+    the atlas pages, built beforehand into cache_dir. The loader uses the atlas;
+    first_step_ms is how long the first loading screen frame waits on it,
+    and worst_step_ms the longest any frame does. sprite_blit_us and
+    atlas_blit_us are the cost of drawing one player frame.
+    """
+    start = time.perf_counter()
+    plain = AssetCache()
+    plain.preload()
+    preload_ms = (time.perf_counter() - start) * 1000
+
+    AssetCache(AssetCache.make_atlas(cache_dir)).preload()
+    start = time.perf_counter()
+    atlas = AssetCache(AssetCache.make_atlas(cache_dir))
+    atlas.preload()
+    atlas_preload_ms = (time.perf_counter() - start) * 1000
+
+    loader = AssetLoader()
+    start = time.perf_counter()
+    AssetCache(AssetCache.make_atlas(cache_dir)).queue_preload(loader)
+    steps = []
+    done = False
+    while not done:
+        step_start = time.perf_counter()
+        done = loader.update()
+        steps.append((time.perf_counter() - step_start) * 1000)
+    loader_ms = (time.perf_counter() - start) * 1000
+    return {
+        "preload_ms": preload_ms,
+        "atlas_preload_ms": atlas_preload_ms,
+        "loader_ms": loader_ms,
+        "first_step_ms": steps[0],
+        "worst_step_ms": max(steps),
+        "sprite_blit_us": blit_cost(plain),
+        "atlas_blit_us": blit_cost(atlas),
+    }
+
+def blit_cost(cache, count=20000):
+    """Microseconds to blit one player animation frame to the display."""
+    window = pygame.display.get_surface()
+    frames = cache.sprite_sheets(*AssetCache.SHEETS[0])["run_right"]
+    start = time.perf_counter()
+    for i in range(count):
+        window.blit(frames[i % len(frames)], ((i * 7) % WIDTH, (i * 13) % HEIGHT))
+    return (time.perf_counter() - start) / count * 1e6
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline):
+    """Print p95 per stage next to a previous run."""
+    for name, scenario in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if not old:
+            continue
+        print(name, file=sys.stderr)
+        for stage in STAGES + ["frame"]:
+            new_ms = scenario["frame"]["p95_ms"] if stage == "frame" else scenario["stages"][stage]["p95_ms"]
+            old_ms = old["frame"]["p95_ms"] if stage == "frame" else old["stages"][stage]["p95_ms"]
+            ratio = f"{new_ms / old_ms:.2f}x" if old_ms else "-"
+            print(f"  {stage:20} p95 {old_ms:8.3f} ms -> {new_ms:8.3f} ms  ({ratio})", file=sys.stderr)
+    if "startup" in baseline:
+        print("asset loading", file=sys.stderr)
+        for name, value in results["startup"].items():
+            old = baseline["startup"].get(name)
+            if old:
+                print(f"  {name:20} {old:8.2f} -> {value:8.2f}  ({value / old:.2f}x)", file=sys.stderr)
+    if "memory" in baseline:
+        print("bytes per entity", file=sys.stderr)
+        for kind, size in results["memory"].items():
+            old = baseline["memory"].get(kind)
+            if old:
+                print(f"  {kind:20} {old:8.0f} -> {size:8.0f}  ({size / old:.2f}x)", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=600, help="ticks to run per scenario")
+    parser.add_argument("--no-draw", action="store_true", help="skip the draw stage")
+    parser.add_argument("--no-stress", action="store_true", help="only run the built-in levels")
+    parser.add_argument("--collision", choices=["mask", "tiles"], default=World.collision,
+                        help="terrain collision mode to play with")
+    parser.add_argument("--substep", action="store_true", help="play with sub-stepped collision")
+    parser.add_argument("--output", metavar="PATH", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", metavar="PATH", help="print p95 changes against an earlier JSON run")
+    args = parser.parse_args()
+
+    window = tutorial.init_display()
+    # Build atlas pages somewhere temporary instead of the game's cache
+    atlas_dir = tempfile.TemporaryDirectory()
+    tutorial.ASSETS.atlas = AssetCache.make_atlas(atlas_dir.name)
+    tutorial.ASSETS.preload()
+    background = get_background("Pink.png")
+
+    scenarios = {}
+    for level in range(1, GameState().max_level + 1):
+        scenarios[f"level_{level}"] = run_scenario(window, background, level=level,
+                                                   ticks=args.ticks, render=not args.no_draw,
+                                                   collision=args.collision, substep=args.substep)
+    if not args.no_stress:
+        for stress in STRESS_LEVELS:
+            name = "stress_{}b_{}e_{}p".format(*stress)
+            scenarios[name] = run_scenario(window, background, stress=stress,
+                                           ticks=args.ticks, render=not args.no_draw,
+                                           collision=args.collision, substep=args.substep)
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "video_driver": pygame.display.get_driver(),
+        "collision": args.collision,
+        "substep": args.substep,
+        "scenarios": scenarios,
+        "memory": entity_memory(),
+        "startup": asset_loading(atlas_dir.name),
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    atlas_dir.cleanup()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
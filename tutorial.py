@@ -1,99 +1,720 @@
 import os
+import re
 import random
 import math
+import time
+import struct
+import zlib
+import json
+import argparse
+from array import array
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
 import pygame
+try:
+    import numpy as np
+except ImportError:  # Optional: ProjectileStore falls back to per-object updates
+    np = None
 from os import listdir
 from os.path import isfile, join
-pygame.init()
 
-pygame.display.set_caption("Advanced Platformer Adventure")
+# Time-to-first-frame and asset load times are measured from here
+STARTED = time.perf_counter()
 
 WIDTH, HEIGHT = 1000, 800
+# Simulation ticks per second, at any frame rate; also the default frame rate cap
 FPS = 60
+TICK_MS = 1000 / FPS
+# Most ticks run to catch up after one slow frame; any more are dropped
+MAX_FRAME_TICKS = 5
 PLAYER_VEL = 5
 
-window = pygame.display.set_mode((WIDTH, HEIGHT))
+# All gameplay randomness goes through this generator so sessions can be replayed
+rng = random.Random()
+
+def seed_rng(seed):
+    rng.seed(seed)
+
+# Work done during the current frame; FrameTimer resets these every frame
+COUNTERS = {"collision_tests": 0, "mask_builds": 0}
+
+def make_mask(surface):
+    COUNTERS["mask_builds"] += 1
+    return pygame.mask.from_surface(surface)
+
+def collide_mask(left, right):
+    COUNTERS["collision_tests"] += 1
+    return pygame.sprite.collide_mask(left, right)
+
+def init_display():
+    pygame.init()
+    pygame.display.set_caption("Advanced Platformer Adventure")
+    return pygame.display.set_mode((WIDTH, HEIGHT))
+
+class AudioManager:
+    """Sound effects and music, silent until init() opens an audio device.
+
+    Each effect is preloaded on its own, so a missing or broken file only
+    silences that sound. play() just queues a sound. flush() starts the
+    queued sounds once per frame on a pool of reserved channels. Repeats
+    of a sound within the frame merge into one, and the most important
+    sounds start first. When every channel is busy, a sound takes over the
+    channel of a less important one or is dropped.
+    """
+    SOUND_DIR = join("assets", "sounds")
+    # Effect name -> priority; a sound only interrupts lower priorities
+    SOUNDS = {"shoot": 0, "jump": 1, "collect": 1, "hit": 2, "checkpoint": 2, "level_complete": 3}
+    MUSIC = join("assets", "sounds", "background_music.wav")
+    MUSIC_VOLUME = 0.3
+    CHANNELS = 8
+    # Different sounds started per frame at most
+    MAX_PER_FRAME = 4
 
-# Initialize mixer for better audio support
-pygame.mixer.init()
+    def __init__(self):
+        self.enabled = False
+        self.sounds = {}
+        self.channels = []
+        self.priorities = []  # Priority of the sound each channel last started
+        self.pending = {}     # Sound name -> play() calls since the last flush()
+        self.music = None
+        self.stats = {"played": 0, "merged": 0, "interrupted": 0, "dropped": 0}
+
+    def init(self):
+        """Open the mixer and reserve the channel pool; returns whether audio works."""
+        if not self.enabled:
+            try:
+                pygame.mixer.init()
+            except pygame.error:
+                return False
+            pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), self.CHANNELS))
+            # Reserved channels are never picked by Sound.play() elsewhere
+            pygame.mixer.set_reserved(self.CHANNELS)
+            self.channels = [pygame.mixer.Channel(i) for i in range(self.CHANNELS)]
+            self.priorities = [-1] * self.CHANNELS
+            self.enabled = True
+        return True
+
+    def sound_path(self, name):
+        return join(self.SOUND_DIR, name + ".wav")
+
+    def add_sound(self, name, sound):
+        self.sounds[name] = sound
+
+    def queue_preload(self, loader):
+        """Open the mixer now, then decode every sound on the loader's threads and start the music.
+
+        Sounds whose files fail to load end up in loader.failed and stay silent.
+        """
+        if not self.init():
+            return
+        for name in self.SOUNDS:
+            loader.load(self.sound_path(name), partial(self.add_sound, name), decode=pygame.mixer.Sound)
+        loader.then(partial(self.play_music, self.MUSIC))
+
+    def play(self, name):
+        """Queue a sound effect for the next flush()."""
+        if name in self.sounds:
+            self.pending[name] = self.pending.get(name, 0) + 1
+
+    def flush(self):
+        """Start the sounds queued since the last flush(), most important first."""
+        if not self.pending:
+            return
+        stats = self.stats
+        for i, name in enumerate(sorted(self.pending, key=self.SOUNDS.get, reverse=True)):
+            stats["merged"] += self.pending[name] - 1
+            channel = self.free_channel(self.SOUNDS[name]) if i < self.MAX_PER_FRAME else None
+            if channel is None:
+                stats["dropped"] += 1
+                continue
+            self.channels[channel].play(self.sounds[name])
+            self.priorities[channel] = self.SOUNDS[name]
+            stats["played"] += 1
+        self.pending.clear()
+
+    def free_channel(self, priority):
+        """An idle channel, else the one playing the least important sound below priority, or None."""
+        lowest = None
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return i
+            if self.priorities[i] < priority and (lowest is None or self.priorities[i] < self.priorities[lowest]):
+                lowest = i
+        if lowest is not None:
+            self.stats["interrupted"] += 1
+        return lowest
+
+    def play_music(self, path, fade_ms=500):
+        """Loop path through pygame.mixer.music, which streams it from disk.
+
+        Asking for the track that is already playing does nothing, so
+        level transitions don't restart or reload it.
+        """
+        if not self.enabled or path == self.music:
+            return
+        try:
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.set_volume(self.MUSIC_VOLUME)
+            pygame.mixer.music.play(-1, fade_ms=fade_ms)
+        except pygame.error:
+            return
+        self.music = path
 
-# Sound effects (optional - will handle missing files gracefully)
-try:
-    jump_sound = pygame.mixer.Sound("assets/sounds/jump.wav")
-    hit_sound = pygame.mixer.Sound("assets/sounds/hit.wav")
-    collect_sound = pygame.mixer.Sound("assets/sounds/collect.wav")
-    shoot_sound = pygame.mixer.Sound("assets/sounds/shoot.wav")
-    checkpoint_sound = pygame.mixer.Sound("assets/sounds/checkpoint.wav")
-    level_complete_sound = pygame.mixer.Sound("assets/sounds/level_complete.wav")
-    
-    # Background music
-    pygame.mixer.music.load("assets/sounds/background_music.wav")
-    pygame.mixer.music.set_volume(0.3)
-    pygame.mixer.music.play(-1)
-except:
-    jump_sound = hit_sound = collect_sound = shoot_sound = None
-    checkpoint_sound = level_complete_sound = None
+# Stays silent for headless simulation, where nothing calls init()
+AUDIO = AudioManager()
 
 def flip(sprites):
     return [pygame.transform.flip(sprite, True, False) for sprite in sprites]
 
-def load_sprite_sheets(dir1, dir2, width, height, direction=False):
-    path = join("assets", dir1, dir2)
-    if not os.path.exists(path):
-        # Return empty dict if path doesn't exist
-        return {}
-    
-    images = [f for f in listdir(path) if isfile(join(path, f))]
-    all_sprites = {}
-
-    for image in images:
-        sprite_sheet = pygame.image.load(join(path, image)).convert_alpha()
-        sprites = []
-        for i in range(sprite_sheet.get_width() // width):
+ATLAS_CACHE_DIR = join("assets", ".cache")
+
+class SpriteAtlas:
+    """Every animation frame of an asset folder packed onto one page.
+
+    build() slices each sheet in a folder the way AssetCache.frames() does,
+    pre-scaled and, under FLIPPED_ROOTS, pre-flipped. It then packs the
+    frames onto a page in ATLAS_CACHE_DIR, beside an index of frame rects
+    and the mtime and size of every source file. Loading a folder's
+    animations is then one image decode, and every frame is a subsurface
+    of one display-format surface. A page is rebuilt when its folder or
+    the slicing changes.
+    """
+    VERSION = 1
+    ROOTS = ["MainCharacters", "Enemies", "Traps", "Items", "Terrain"]
+    # Folders under these roots also get mirrored frames for facing left
+    FLIPPED_ROOTS = {"MainCharacters", "Enemies"}
+    SCALE = 2
+    PAGE_WIDTH = 1024
+    # Frame size as written in file names like "Idle (36x30).png"
+    FRAME_SIZE = re.compile(r"\((\d+)x(\d+)\)")
+
+    def __init__(self, frame_sizes=None, crops=None, cache_dir=ATLAS_CACHE_DIR):
+        # Frame size per folder, for sheets whose names don't give one
+        self.frame_sizes = frame_sizes or {}
+        # Single regions to pack per file, such as terrain tiles
+        self.crops = crops or {}
+        self.cache_dir = cache_dir
+        self.entries = {}  # folder -> index entry, or None if stale
+        self.pages = {}    # folder -> page surface
+        self.loaded = {}   # (path, region, flipped) -> frames
+
+    @staticmethod
+    def root(folder):
+        return os.path.relpath(folder, "assets").split(os.sep)[0]
+
+    def covers(self, folder):
+        return self.root(folder) in self.ROOTS
+
+    def folders(self):
+        """Every folder under ROOTS that holds images."""
+        found = []
+        for root in self.ROOTS:
+            for folder, _, files in sorted(os.walk(join("assets", root))):
+                if any(name.endswith(".png") for name in files):
+                    found.append(folder)
+        return found
+
+    def page_path(self, folder, ext=".bmp"):
+        # BMP decodes several times faster than PNG and keeps alpha exactly
+        name = os.path.relpath(folder, "assets").replace(os.sep, "_")
+        return join(self.cache_dir, name + ext)
+
+    def plan(self, folder):
+        """[path, region, flipped] for every sheet to slice and region to crop in folder.
+
+        region is a [width, height] frame size for sheets, an [x, y, width,
+        height] rect for crops, or None for a strip of square frames as
+        tall as the image.
+        """
+        flips = [False, True] if self.root(folder) in self.FLIPPED_ROOTS else [False]
+        jobs = []
+        for name in sorted(listdir(folder)):
+            path = join(folder, name)
+            if not name.endswith(".png") or not isfile(path):
+                continue
+            if path in self.crops:
+                jobs += [[path, list(rect), False] for rect in self.crops[path]]
+                continue
+            match = self.FRAME_SIZE.search(name)
+            size = self.frame_sizes.get(folder)
+            if match:
+                size = (int(match.group(1)), int(match.group(2)))
+            jobs += [[path, size and list(size), flipped] for flipped in flips]
+        return jobs
+
+    @staticmethod
+    def sources(folder):
+        sources = {}
+        for name in listdir(folder):
+            if name.endswith(".png"):
+                stat = os.stat(join(folder, name))
+                sources[name] = [stat.st_mtime_ns, stat.st_size]
+        return sources
+
+    def entry(self, folder):
+        """folder's index entry if its page was built from its files as they are now, else None."""
+        if folder not in self.entries:
+            try:
+                with open(self.page_path(folder, ".json")) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+            if (entry is None or entry.get("version") != self.VERSION or
+                    entry["sources"] != self.sources(folder) or entry["plan"] != self.plan(folder) or
+                    not os.path.exists(self.page_path(folder))):
+                entry = None
+            self.entries[folder] = entry
+        return self.entries[folder]
+
+    def build(self, folder):
+        """Slice and pack folder's sheets onto a page and save it with its index entry."""
+        slicer = AssetCache()
+        plan = self.plan(folder)
+        jobs = []
+        frames = []
+        for path, region, flipped in plan:
+            if region is None:
+                height = slicer.image(path).get_height()
+                region = [height, height]
+            jobs.append([path, region, flipped])
+            if len(region) == 4:
+                frames.append([slicer.crop(path, region, self.SCALE, flipped)])
+            else:
+                frames.append(slicer.frames(path, *region, scale=self.SCALE, flipped=flipped))
+
+        # Shelf packing, in order: frames of one sheet share a height
+        sizes = [frame.get_size() for sheet in frames for frame in sheet]
+        width = max([min(self.PAGE_WIDTH, sum(w for w, _ in sizes))] + [w for w, _ in sizes])
+        x = y = shelf = 0
+        rects = []
+        for sheet in frames:
+            sheet_rects = []
+            for frame in sheet:
+                w, h = frame.get_size()
+                if x + w > width:
+                    x, y, shelf = 0, y + shelf, 0
+                sheet_rects.append([x, y, w, h])
+                x += w
+                shelf = max(shelf, h)
+            rects.append(sheet_rects)
+        page = pygame.Surface((max(1, width), max(1, y + shelf)), pygame.SRCALPHA)
+        for sheet, sheet_rects in zip(frames, rects):
+            for frame, rect in zip(sheet, sheet_rects):
+                # MAX onto the cleared page copies pixels without blending
+                page.blit(frame, rect[:2], special_flags=pygame.BLEND_RGBA_MAX)
+
+        entry = {
+            "version": self.VERSION,
+            "sources": self.sources(folder),
+            "plan": plan,
+            "frames": [job + [sheet_rects] for job, sheet_rects in zip(jobs, rects)],
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            pygame.image.save(page, self.page_path(folder))
+            with open(self.page_path(folder, ".json"), "w") as f:
+                json.dump(entry, f)
+        except (OSError, pygame.error):
+            pass  # A read-only install keeps this page in memory only
+        self.entries[folder] = entry
+        self.add_page(folder, page)
+
+    def build_all(self):
+        """Rebuild every stale page; returns the folders rebuilt."""
+        stale = [folder for folder in self.folders() if not self.entry(folder)]
+        for folder in stale:
+            self.build(folder)
+        return stale
+
+    def add_page(self, folder, page):
+        """Use a decoded page; must run on the main thread."""
+        if pygame.display.get_surface():
+            page = page.convert_alpha()
+        self.pages[folder] = page
+
+    def ensure(self, folder):
+        """Make folder's page usable, building it first if it is missing or stale."""
+        if not self.entry(folder):
+            self.build(folder)
+        elif folder not in self.pages:
+            self.add_page(folder, pygame.image.load(self.page_path(folder)))
+
+    def frames(self, path, region, flipped=False):
+        """Frames packed for a sheet (region is a frame size) or crop (a rect), or None."""
+        key = (path, tuple(region), flipped)
+        if key not in self.loaded:
+            folder = os.path.dirname(path)
+            if not self.covers(folder) or not os.path.isdir(folder):
+                return None
+            self.ensure(folder)
+            page = self.pages[folder]
+            for job_path, job_region, job_flipped, rects in self.entries[folder]["frames"]:
+                if (job_path, tuple(job_region), job_flipped) == key:
+                    self.loaded[key] = [page.subsurface(rect) for rect in rects]
+                    break
+            else:
+                return None
+        return self.loaded[key]
+
+class AssetCache:
+    """Process-wide store of decoded, converted and scaled surfaces.
+
+    Surfaces are keyed by source path, crop rect (frame size), scale and flip,
+    so every Block, Player and Fire built from the same sheet shares them.
+    """
+    # Everything the built-in levels need, loaded once by preload()
+    SHEETS = [
+        ("MainCharacters", "PinkMan", 32, 32, True),
+        ("Traps", "Fire", 16, 32, False),
+    ]
+    BLOCK_SIZES = [96]
+    BACKGROUNDS = ["Pink.png"]
+    TERRAIN = join("assets", "Terrain", "Terrain.png")
+
+    def __init__(self, atlas=None):
+        self.images = {}
+        self.surfaces = {}
+        self.sheets = {}
+        self.masks = {}
+        self.built = {}
+        # SpriteAtlas that frames() and crop() are served from when it has them
+        self.atlas = atlas
+
+    @classmethod
+    def make_atlas(cls, cache_dir=ATLAS_CACHE_DIR):
+        """A SpriteAtlas slicing SHEETS and the terrain blocks the way the cache does."""
+        return SpriteAtlas({join("assets", dir1, dir2): (width, height)
+                            for dir1, dir2, width, height, _ in cls.SHEETS},
+                           {cls.TERRAIN: [(96, 0, size, size) for size in cls.BLOCK_SIZES]},
+                           cache_dir)
+
+    def image(self, path, alpha=True):
+        key = (path, alpha)
+        if key not in self.images:
+            self.add_image(path, alpha, pygame.image.load(path))
+        return self.images[key]
+
+    def add_image(self, path, alpha, image):
+        """Cache a decoded image for image(); must run on the main thread."""
+        # Conversion needs a display; headless runs keep the decoded pixels
+        if pygame.display.get_surface():
+            image = image.convert_alpha() if alpha else image.convert()
+        self.images[(path, alpha)] = image
+
+    def crop(self, path, rect, scale=2, flipped=False):
+        key = (path, tuple(rect), scale, flipped)
+        if key not in self.surfaces and self.atlas and scale == SpriteAtlas.SCALE:
+            packed = self.atlas.frames(path, rect, flipped)
+            if packed:
+                self.surfaces[key] = packed[0]
+        if key not in self.surfaces:
+            _, _, width, height = rect
             surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
-            rect = pygame.Rect(i * width, 0, width, height)
-            surface.blit(sprite_sheet, (0, 0), rect)
-            sprites.append(pygame.transform.scale2x(surface))
-
+            surface.blit(self.image(path), (0, 0), pygame.Rect(rect))
+            if scale == 2:
+                surface = pygame.transform.scale2x(surface)
+            elif scale != 1:
+                surface = pygame.transform.scale(surface, (width * scale, height * scale))
+            if flipped:
+                surface = pygame.transform.flip(surface, True, False)
+            self.surfaces[key] = surface
+        return self.surfaces[key]
+
+    def frames(self, path, width, height, scale=2, flipped=False):
+        if self.atlas and scale == SpriteAtlas.SCALE:
+            packed = self.atlas.frames(path, (width, height), flipped)
+            if packed is not None:
+                return packed
+        count = self.image(path).get_width() // width
+        return [self.crop(path, (i * width, 0, width, height), scale, flipped)
+                for i in range(count)]
+
+    def sprite_sheets(self, dir1, dir2, width, height, direction=False):
+        key = (dir1, dir2, width, height, direction)
+        if key in self.sheets:
+            return self.sheets[key]
+
+        all_sprites = {}
+        for sheet_path in self.sheet_paths(dir1, dir2):
+            self.sheet_frames(all_sprites, sheet_path, width, height, direction)
+
+        self.sheets[key] = all_sprites
+        return all_sprites
+
+    def sheet_paths(self, dir1, dir2):
+        path = join("assets", dir1, dir2)
+        if not os.path.exists(path):
+            return []
+        return [join(path, f) for f in listdir(path) if isfile(join(path, f))]
+
+    def sheet_frames(self, all_sprites, sheet_path, width, height, direction):
+        name = os.path.basename(sheet_path).replace(".png", "")
         if direction:
-            all_sprites[image.replace(".png", "") + "_right"] = sprites
-            all_sprites[image.replace(".png", "") + "_left"] = flip(sprites)
+            all_sprites[name + "_right"] = self.frames(sheet_path, width, height)
+            all_sprites[name + "_left"] = self.frames(sheet_path, width, height, flipped=True)
         else:
-            all_sprites[image.replace(".png", "")] = sprites
+            all_sprites[name] = self.frames(sheet_path, width, height)
 
-    return all_sprites
+    def sprite_masks(self, dir1, dir2, width, height, direction=False):
+        """Collision masks parallel to sprite_sheets(), one per frame."""
+        key = (dir1, dir2, width, height, direction)
+        if key not in self.masks:
+            self.masks[key] = build_masks(self.sprite_sheets(*key))
+        return self.masks[key]
 
-def get_block(size):
-    try:
-        path = join("assets", "Terrain", "Terrain.png")
-        image = pygame.image.load(path).convert_alpha()
-        surface = pygame.Surface((size, size), pygame.SRCALPHA, 32)
-        rect = pygame.Rect(96, 0, size, size)
-        surface.blit(image, (0, 0), rect)
-        return pygame.transform.scale2x(surface)
-    except:
-        # Fallback if terrain image doesn't exist
-        surface = pygame.Surface((size * 2, size * 2))
-        surface.fill((100, 100, 100))
-        return surface
+    def block(self, size):
+        return self.get_or_build(("block", size), lambda: self.load_block(size))
 
-def get_background(name):
-    try:
-        image = pygame.image.load(join("assets", "Background", name))
-        _, _, width, height = image.get_rect()
-        tiles = []
+    def load_block(self, size):
+        path = self.TERRAIN
+        try:
+            return self.crop(path, (96, 0, size, size))
+        except:
+            # Fallback if terrain image doesn't exist
+            return make_fallback_block(size)
 
-        for i in range(WIDTH // width + 1):
-            for j in range(HEIGHT // height + 1):
-                pos = (i * width, j * height)
-                tiles.append(pos)
+    def background(self, name):
+        return self.get_or_build(("background", name), lambda: self.load_background(name))
 
-        return tiles, image
-    except:
+    def load_background(self, name):
+        try:
+            return self.image(self.background_path(name), alpha=False)
+        except:
+            return None
+
+    def get_or_build(self, key, builder):
+        """Cache the result of builder(), including fallbacks for missing files."""
+        if key not in self.built:
+            self.built[key] = builder()
+        return self.built[key]
+
+    @staticmethod
+    def background_path(name):
+        return join("assets", "Background", name)
+
+    def preload(self):
+        for sheet in self.SHEETS:
+            self.sprite_sheets(*sheet)
+            self.sprite_masks(*sheet)
+        for size in self.BLOCK_SIZES:
+            self.block(size)
+        for name in self.BACKGROUNDS:
+            self.background(name)
+
+    def queue_preload(self, loader):
+        """Queue what preload() does on an AssetLoader, one sheet file per step.
+
+        Files are read and decoded on the loader's threads. Conversion,
+        cropping, scaling and masks run on the main thread in update().
+        """
+        for dir1, dir2, width, height, direction in self.SHEETS:
+            key = (dir1, dir2, width, height, direction)
+            folder = join("assets", dir1, dir2)
+            if self.queue_atlas_page(loader, folder):
+                loader.then(partial(self.sprite_sheets, *key))
+                loader.then(partial(self.sprite_masks, *key))
+                continue
+            all_sprites = {}
+            for sheet_path in self.sheet_paths(dir1, dir2):
+                loader.load(sheet_path, partial(self.add_image, sheet_path, True))
+                loader.then(partial(self.sheet_frames, all_sprites, sheet_path, width, height, direction))
+            loader.then(partial(self.sheets.__setitem__, key, all_sprites))
+            loader.then(partial(self.sprite_masks, *key))
+        if not self.queue_atlas_page(loader, os.path.dirname(self.TERRAIN)):
+            loader.load(self.TERRAIN, partial(self.add_image, self.TERRAIN, True))
+        for size in self.BLOCK_SIZES:
+            loader.then(partial(self.block, size))
+        for name in self.BACKGROUNDS:
+            path = self.background_path(name)
+            loader.load(path, partial(self.add_image, path, False))
+            loader.then(partial(self.background, name))
+
+    def queue_atlas_page(self, loader, folder):
+        """Queue loading folder's atlas page, or building it on a first run.
+
+        Returns False if the atlas doesn't cover folder, so its sheets have
+        to be loaded file by file.
+        """
+        atlas = self.atlas
+        if not atlas or not atlas.covers(folder) or not os.path.isdir(folder):
+            return False
+        if atlas.entry(folder):
+            loader.load(atlas.page_path(folder), partial(atlas.add_page, folder))
+        else:
+            loader.then(partial(atlas.build, folder))
+        return True
+
+    def memory_usage(self):
+        """Approximate bytes held by cached pixel data."""
+        seen = {}
+
+        def collect(value):
+            if isinstance(value, pygame.Surface):
+                seen[id(value)] = value
+            elif isinstance(value, dict):
+                for item in value.values():
+                    collect(item)
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    collect(item)
+
+        collect(self.images)
+        collect(self.surfaces)
+        collect(self.built)
+        return sum(surface.get_pitch() * surface.get_height() for surface in seen.values())
+
+ASSETS = AssetCache(AssetCache.make_atlas())
+
+class AssetLoader:
+    """Loads assets behind a loading screen without stalling the window.
+
+    load() reads and decodes a file on a thread pool; then() queues
+    work that has to run on the main thread, such as surface conversion.
+    update() runs the queued steps in order, for up to a frame's budget,
+    as soon as the files they wait on are decoded.
+    """
+    WORKERS = 4
+    FRAME_BUDGET_MS = 8
+
+    def __init__(self, workers=WORKERS):
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="asset-loader")
+        self.steps = deque()  # (future or None, main-thread callable, path)
+        self.total = 0
+        self.done = 0
+        # Files that failed to decode; their builders fall back as before
+        self.failed = []
+
+    def load(self, path, finish, decode=pygame.image.load):
+        """Decode the file at path in the background, then call finish(decoded)."""
+        self.steps.append((self.pool.submit(decode, path), finish, path))
+        self.total += 1
+
+    def then(self, step):
+        """Call step() on the main thread once everything queued before it is done."""
+        self.steps.append((None, step, None))
+        self.total += 1
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    def update(self, budget_ms=FRAME_BUDGET_MS):
+        """Run the steps that are ready for up to budget_ms; returns whether all are done."""
+        deadline = time.perf_counter() + budget_ms / 1000
+        while self.steps:
+            future, finish, path = self.steps[0]
+            if future is not None and not future.done():
+                break
+            self.steps.popleft()
+            if future is None:
+                finish()
+            else:
+                try:
+                    decoded = future.result()
+                except (pygame.error, OSError):
+                    self.failed.append(path)
+                else:
+                    finish(decoded)
+            self.done += 1
+            if time.perf_counter() >= deadline:
+                break
+        if not self.steps:
+            self.pool.shutdown()
+        return not self.steps
+
+    def complete(self):
+        """Block until everything is loaded, for callers without a loading screen."""
+        while not self.update(math.inf):
+            wait([self.steps[0][0]])
+
+def make_fallback_block(size):
+    surface = pygame.Surface((size * 2, size * 2))
+    surface.fill((100, 100, 100))
+    return surface
+
+def build_masks(sprites):
+    return {name: [make_mask(sprite) for sprite in frames]
+            for name, frames in sprites.items()}
+
+def load_sprite_sheets(dir1, dir2, width, height, direction=False):
+    return ASSETS.sprite_sheets(dir1, dir2, width, height, direction)
+
+def load_sprite_masks(dir1, dir2, width, height, direction=False):
+    return ASSETS.sprite_masks(dir1, dir2, width, height, direction)
+
+def get_block(size):
+    return ASSETS.block(size)
+
+class ParallaxLayer:
+    """A repeating background image that scrolls at factor times the camera's speed.
+
+    The image is tiled once into a strip a whole number of tiles wide and
+    at least as wide as the screen. Since the strip repeats seamlessly,
+    any scroll position is drawn by at most two blits of it.
+    """
+    def __init__(self, image, factor=1.0, y=0, repeat_y=True):
+        self.factor = factor
+        self.y = y
+        width, height = image.get_size()
+        columns = -(-WIDTH // width)
+        rows = max(1, -(-(HEIGHT - y) // height)) if repeat_y else 1
+        alpha = bool(image.get_flags() & pygame.SRCALPHA)
+        strip = pygame.Surface((columns * width, rows * height), pygame.SRCALPHA if alpha else 0)
+        for i in range(columns):
+            for j in range(rows):
+                # MAX onto the cleared strip copies pixels without blending
+                strip.blit(image, (i * width, j * height), special_flags=pygame.BLEND_RGBA_MAX if alpha else 0)
+        if pygame.display.get_surface():
+            strip = strip.convert_alpha() if alpha else strip.convert()
+        self.strip = strip
+        # Whether this layer alone covers the whole screen
+        self.opaque = not alpha and repeat_y and y <= 0
+
+    def draw(self, window, offset_x):
+        width = self.strip.get_width()
+        x = -(math.floor(offset_x * self.factor) % width)
+        window.blit(self.strip, (x, self.y))
+        if x + width < WIDTH:
+            window.blit(self.strip, (x + width, self.y))
+
+class ParallaxBackground:
+    """Parallax layers drawn back to front, the first one furthest away."""
+    def __init__(self, layers):
+        self.layers = layers
+
+    def draw(self, window, offset_x):
+        # Only clear the screen if no layer is known to cover it
+        if not any(layer.opaque for layer in self.layers):
+            window.fill((50, 50, 100))  # Dark blue fallback
+        for layer in self.layers:
+            layer.draw(window, offset_x)
+
+def get_background(name):
+    image = ASSETS.background(name)
+    if image is None:
         # Fallback background
         image = pygame.Surface((WIDTH, HEIGHT))
         image.fill((135, 206, 250))  # Sky blue
-        return [(0, 0)], image
+        return ParallaxBackground([ParallaxLayer(image, factor=0)])
+    return ParallaxBackground([ParallaxLayer(image)])
+
+def make_fallback_player_sprites():
+    sprites_by_name = {}
+    colors = {"idle": (255, 0, 0), "run": (255, 100, 100), "jump": (255, 200, 200), 
+             "fall": (200, 0, 0), "hit": (100, 0, 0), "double_jump": (255, 150, 150)}
+    
+    for state in colors:
+        for direction in ["left", "right"]:
+            sprites = []
+            for i in range(4):  # Create 4 frame animation
+                surface = pygame.Surface((64, 64), pygame.SRCALPHA)
+                pygame.draw.rect(surface, colors[state], (16, 16, 32, 48))
+                if direction == "left":
+                    surface = pygame.transform.flip(surface, True, False)
+                sprites.append(surface)
+            sprites_by_name[f"{state}_{direction}"] = sprites
+    return sprites_by_name
 
 class GameState:
     MENU = "menu"
@@ -101,21 +722,30 @@ class GameState:
     GAME_OVER = "game_over"
     PAUSED = "paused"
     LEVEL_COMPLETE = "level_complete"
+    LOADING = "loading"
     
     def __init__(self):
+        if not pygame.font.get_init():
+            pygame.font.init()
         self.state = self.MENU
         self.score = 0
         self.health = 100
         self.max_health = 100
         self.lives = 3
         self.current_level = 1
-        self.max_level = 3
+        self.max_level = LEVEL_COUNT
         self.fruits_collected = 0
         self.font = pygame.font.Font(None, 36)
         self.small_font = pygame.font.Font(None, 24)
         self.title_font = pygame.font.Font(None, 72)
         self.checkpoint_reached = False
         self.checkpoint_pos = (100, 100)
+        # Fraction of the assets loaded, shown while state is LOADING
+        self.loading_progress = 0.0
+        # Rendered text per HUD slot, and what the last presented overlay showed
+        self.text_cache = {}
+        self.presented_overlay = None
+        self.overlay_rects = []
         
     def take_damage(self, damage):
         self.health -= damage
@@ -131,22 +761,15 @@ class GameState:
         self.health = min(self.max_health, self.health + amount)
     
     def draw_ui(self, window):
+        """Draw the HUD or the current overlay screen and return the rects drawn."""
+        dirty = []
         if self.state == self.PLAYING or self.state == self.PAUSED:
-            # Draw score
-            score_text = self.font.render(f"Score: {self.score}", True, (255, 255, 255))
-            window.blit(score_text, (10, 10))
-            
-            # Draw lives
-            lives_text = self.font.render(f"Lives: {self.lives}", True, (255, 255, 255))
-            window.blit(lives_text, (10, 50))
-            
-            # Draw fruits
-            fruits_text = self.font.render(f"Fruits: {self.fruits_collected}", True, (255, 255, 255))
-            window.blit(fruits_text, (10, 90))
-            
-            # Draw level
-            level_text = self.font.render(f"Level: {self.current_level}", True, (255, 255, 255))
-            window.blit(level_text, (10, 130))
+            white = (255, 255, 255)
+            # Draw score, lives, fruits and level
+            dirty.append(self.blit_text(window, "score", self.font, f"Score: {self.score}", white, topleft=(10, 10)))
+            dirty.append(self.blit_text(window, "lives", self.font, f"Lives: {self.lives}", white, topleft=(10, 50)))
+            dirty.append(self.blit_text(window, "fruits", self.font, f"Fruits: {self.fruits_collected}", white, topleft=(10, 90)))
+            dirty.append(self.blit_text(window, "level", self.font, f"Level: {self.current_level}", white, topleft=(10, 130)))
             
             # Draw health bar
             health_bar_width = 200
@@ -162,33 +785,49 @@ class GameState:
                 color = (255, 255 * health_percentage * 2, 0)
             pygame.draw.rect(window, color, (WIDTH - 220, 10, health_bar_width * health_percentage, health_bar_height))
             # Border
-            pygame.draw.rect(window, (255, 255, 255), (WIDTH - 220, 10, health_bar_width, health_bar_height), 2)
+            dirty.append(pygame.draw.rect(window, (255, 255, 255), (WIDTH - 220, 10, health_bar_width, health_bar_height), 2))
             
             # Health text
-            health_text = self.small_font.render(f"Health: {int(self.health)}/{self.max_health}", True, (255, 255, 255))
-            window.blit(health_text, (WIDTH - 220, 35))
+            health_text = f"Health: {int(self.health)}/{self.max_health}"
+            dirty.append(self.blit_text(window, "health", self.small_font, health_text, white, topleft=(WIDTH - 220, 35)))
             
             # Pause indicator
             if self.state == self.PAUSED:
-                pause_text = self.title_font.render("PAUSED", True, (255, 255, 255))
-                text_rect = pause_text.get_rect(center=(WIDTH//2, HEIGHT//2))
-                window.blit(pause_text, text_rect)
-                resume_text = self.font.render("Press P to Resume", True, (255, 255, 255))
-                resume_rect = resume_text.get_rect(center=(WIDTH//2, HEIGHT//2 + 80))
-                window.blit(resume_text, resume_rect)
+                dirty.append(self.blit_text(window, "paused", self.title_font, "PAUSED", white,
+                                            center=(WIDTH//2, HEIGHT//2)))
+                dirty.append(self.blit_text(window, "resume", self.font, "Press P to Resume", white,
+                                            center=(WIDTH//2, HEIGHT//2 + 80)))
         
         elif self.state == self.MENU:
-            self.draw_menu(window)
+            dirty.extend(self.draw_menu(window))
         elif self.state == self.GAME_OVER:
-            self.draw_game_over(window)
+            dirty.extend(self.draw_game_over(window))
         elif self.state == self.LEVEL_COMPLETE:
-            self.draw_level_complete(window)
+            dirty.extend(self.draw_level_complete(window))
+        elif self.state == self.LOADING:
+            dirty.extend(self.draw_loading(window))
+        return dirty
+
+    def blit_text(self, window, slot, font, text, color, **position):
+        """Blit text that is only re-rendered when the value in its slot changes."""
+        key = (font, text, color)
+        cached = self.text_cache.get(slot)
+        if cached is None or cached[0] != key:
+            cached = (key, font.render(text, True, color))
+            self.text_cache[slot] = cached
+        surface = cached[1]
+        return window.blit(surface, surface.get_rect(**position))
+
+    def overlay_key(self):
+        """Everything an overlay screen shows; None while the world is being played."""
+        if self.state in (self.MENU, self.GAME_OVER, self.LEVEL_COMPLETE):
+            return (self.state, self.score, self.current_level, self.max_level)
+        return None
     
     def draw_menu(self, window):
         # Title
-        title_text = self.title_font.render("PLATFORMER ADVENTURE", True, (255, 215, 0))
-        title_rect = title_text.get_rect(center=(WIDTH//2, HEIGHT//2 - 100))
-        window.blit(title_text, title_rect)
+        dirty = [self.blit_text(window, "title", self.title_font, "PLATFORMER ADVENTURE", (255, 215, 0),
+                                center=(WIDTH//2, HEIGHT//2 - 100))]
         
         # Instructions
         instructions = [
@@ -203,57 +842,86 @@ class GameState:
         ]
         
         y_offset = HEIGHT//2 - 20
-        for instruction in instructions:
-            text = self.font.render(instruction, True, (255, 255, 255))
-            text_rect = text.get_rect(center=(WIDTH//2, y_offset))
-            window.blit(text, text_rect)
+        for i, instruction in enumerate(instructions):
+            dirty.append(self.blit_text(window, ("instruction", i), self.font, instruction, (255, 255, 255),
+                                        center=(WIDTH//2, y_offset)))
             y_offset += 35
+        return dirty
     
     def draw_game_over(self, window):
-        game_over_text = self.title_font.render("GAME OVER", True, (255, 0, 0))
-        text_rect = game_over_text.get_rect(center=(WIDTH//2, HEIGHT//2 - 50))
-        window.blit(game_over_text, text_rect)
-        
-        score_text = self.font.render(f"Final Score: {self.score}", True, (255, 255, 255))
-        score_rect = score_text.get_rect(center=(WIDTH//2, HEIGHT//2 + 20))
-        window.blit(score_text, score_rect)
-        
-        restart_text = self.font.render("Press R to Restart or M for Menu", True, (255, 255, 255))
-        restart_rect = restart_text.get_rect(center=(WIDTH//2, HEIGHT//2 + 60))
-        window.blit(restart_text, restart_rect)
+        white = (255, 255, 255)
+        return [
+            self.blit_text(window, "title", self.title_font, "GAME OVER", (255, 0, 0),
+                           center=(WIDTH//2, HEIGHT//2 - 50)),
+            self.blit_text(window, "final_score", self.font, f"Final Score: {self.score}", white,
+                           center=(WIDTH//2, HEIGHT//2 + 20)),
+            self.blit_text(window, "restart", self.font, "Press R to Restart or M for Menu", white,
+                           center=(WIDTH//2, HEIGHT//2 + 60)),
+        ]
     
     def draw_level_complete(self, window):
-        complete_text = self.title_font.render("LEVEL COMPLETE!", True, (0, 255, 0))
-        text_rect = complete_text.get_rect(center=(WIDTH//2, HEIGHT//2 - 50))
-        window.blit(complete_text, text_rect)
+        dirty = [self.blit_text(window, "title", self.title_font, "LEVEL COMPLETE!", (0, 255, 0),
+                                center=(WIDTH//2, HEIGHT//2 - 50))]
         
         if self.current_level < self.max_level:
-            next_text = self.font.render("Press N for Next Level or M for Menu", True, (255, 255, 255))
+            next_text = "Press N for Next Level or M for Menu"
         else:
-            next_text = self.font.render("Congratulations! You beat all levels!", True, (255, 255, 255))
+            next_text = "Congratulations! You beat all levels!"
         
-        next_rect = next_text.get_rect(center=(WIDTH//2, HEIGHT//2 + 20))
-        window.blit(next_text, next_rect)
+        dirty.append(self.blit_text(window, "next", self.font, next_text, (255, 255, 255),
+                                    center=(WIDTH//2, HEIGHT//2 + 20)))
+        return dirty
+
+    def draw_loading(self, window):
+        white = (255, 255, 255)
+        bar = pygame.Rect(0, 0, 400, 24)
+        bar.center = (WIDTH//2, HEIGHT//2 + 30)
+        pygame.draw.rect(window, white, (bar.x, bar.y, bar.width * self.loading_progress, bar.height))
+        return [
+            self.blit_text(window, "title", self.title_font, "LOADING", (255, 215, 0),
+                           center=(WIDTH//2, HEIGHT//2 - 50)),
+            pygame.draw.rect(window, white, bar, 2),
+            self.blit_text(window, "progress", self.font, f"{int(self.loading_progress * 100)}%", white,
+                           center=(WIDTH//2, HEIGHT//2 + 80)),
+        ]
+
+def interpolated_rect(rect, prev_pos, alpha, snap_distance):
+    """rect moved back toward prev_pos, to where it was alpha of the way through the last tick."""
+    prev_x, prev_y = prev_pos
+    dx, dy = prev_x - rect.x, prev_y - rect.y
+    # Respawns and other jumps of more than a few ticks' travel snap
+    if abs(dx) + abs(dy) < snap_distance:
+        return rect.move(round(dx * (1 - alpha)), round(dy * (1 - alpha)))
+    return rect
 
 class Player(pygame.sprite.Sprite):
     COLOR = (255, 0, 0)
     GRAVITY = 1
     ANIMATION_DELAY = 3
+    # Body inside the 64x64 sprite frame, used by tile collision: (x, y, width, height)
+    HITBOX = (12, 14, 40, 50)
+    # Moves longer than this in one tick are drawn without interpolation
+    SNAP_DISTANCE = 100
 
     def __init__(self, x, y, width, height):
         super().__init__()
         # Load sprites after initialization
         self.SPRITES = load_sprite_sheets("MainCharacters", "PinkMan", 32, 32, True)
+        self.MASKS = load_sprite_masks("MainCharacters", "PinkMan", 32, 32, True)
         
         # Create fallback sprites if loading fails
         if not self.SPRITES:
             self.create_fallback_sprites()
         
         self.rect = pygame.Rect(x, y, width, height)
+        # Where the previous tick left the player, for drawing between ticks
+        self.prev_pos = (x, y)
         self.x_vel = 0
         self.y_vel = 0
         self.mask = None
         self.direction = "left"
+        # Drawn if a frame comes before the first tick picks the animation frame
+        self.sprite = self.SPRITES["idle_left"][0]
         self.animation_count = 0
         self.fall_count = 0
         self.jump_count = 0
@@ -264,38 +932,13 @@ class Player(pygame.sprite.Sprite):
         self.max_speed = PLAYER_VEL
         self.wall_slide = False
         self.wall_jump_cooldown = 0
+        # Hazards and pickups passed through during this tick's sub-stepped move
+        self.swept = []
 
     def create_fallback_sprites(self):
         """Create simple fallback sprites if asset loading fails"""
-        self.SPRITES = {}
-        colors = {"idle": (255, 0, 0), "run": (255, 100, 100), "jump": (255, 200, 200), 
-                 "fall": (200, 0, 0), "hit": (100, 0, 0), "double_jump": (255, 150, 150)}
-        
-        for state in colors:
-            for direction in ["left", "right"]:
-                sprites = []
-                for i in range(4):  # Create 4 frame animation
-                    surface = pygame.Surface((64, 64), pygame.SRCALPHA)
-                    pygame.draw.rect(surface, colors[state], (16, 16, 32, 48))
-                    if direction == "left":
-                        surface = pygame.transform.flip(surface, True, False)
-                    sprites.append(surface)
-                self.SPRITES[f"{state}_{direction}"] = sprites
-        self.rect = pygame.Rect(x, y, width, height)
-        self.x_vel = 0
-        self.y_vel = 0
-        self.mask = None
-        self.direction = "left"
-        self.animation_count = 0
-        self.fall_count = 0
-        self.jump_count = 0
-        self.hit = False
-        self.hit_count = 0
-        self.dash_cooldown = 0
-        self.dash_power = 15
-        self.max_speed = PLAYER_VEL
-        self.wall_slide = False
-        self.wall_jump_cooldown = 0
+        self.SPRITES = ASSETS.get_or_build("player_fallback", make_fallback_player_sprites)
+        self.MASKS = ASSETS.get_or_build("player_fallback_masks", lambda: build_masks(self.SPRITES))
 
     def jump(self):
         if self.jump_count < 2 or self.wall_slide:
@@ -311,8 +954,7 @@ class Player(pygame.sprite.Sprite):
             
             if self.jump_count == 1:
                 self.fall_count = 0
-            if jump_sound:
-                jump_sound.play()
+            AUDIO.play("jump")
 
     def dash(self):
         if self.dash_cooldown <= 0:
@@ -326,11 +968,14 @@ class Player(pygame.sprite.Sprite):
         self.rect.x += dx
         self.rect.y += dy
 
+    def hitbox(self):
+        x, y, width, height = self.HITBOX
+        return pygame.Rect(self.rect.x + x, self.rect.y + y, width, height)
+
     def make_hit(self):
         if not self.hit:
             self.hit = True
-            if hit_sound:
-                hit_sound.play()
+            AUDIO.play("hit")
 
     def move_left(self, vel):
         if self.wall_jump_cooldown <= 0:
@@ -352,14 +997,19 @@ class Player(pygame.sprite.Sprite):
         else:
             self.x_vel = 0
 
-    def loop(self, fps):
+    def loop(self, fps, mover=None):
         # Wall slide logic
         if self.wall_slide and self.y_vel > 0:
             self.y_vel = min(self.y_vel, 2)  # Slower fall when wall sliding
         else:
             self.y_vel += min(1, (self.fall_count / fps) * self.GRAVITY)
         
-        self.move(self.x_vel, self.y_vel)
+        self.swept = []
+        if mover is None:
+            self.move(self.x_vel, self.y_vel)
+        else:
+            # TileMap or SubstepMover: stop at terrain instead of passing into it
+            mover.move(self, self.x_vel, self.y_vel)
 
         if self.hit:
             self.hit_count += 1
@@ -403,31 +1053,30 @@ class Player(pygame.sprite.Sprite):
             sprite_sheet = "run"
 
         sprite_sheet_name = sprite_sheet + "_" + self.direction
-        if sprite_sheet_name in self.SPRITES:
-            sprites = self.SPRITES[sprite_sheet_name]
-            sprite_index = (self.animation_count // self.ANIMATION_DELAY) % len(sprites)
-            self.sprite = sprites[sprite_index]
-        else:
+        if sprite_sheet_name not in self.SPRITES:
             # Fallback to idle if sprite doesn't exist
             sprite_sheet_name = "idle_" + self.direction
-            sprites = self.SPRITES[sprite_sheet_name]
-            sprite_index = (self.animation_count // self.ANIMATION_DELAY) % len(sprites)
-            self.sprite = sprites[sprite_index]
+        sprites = self.SPRITES[sprite_sheet_name]
+        sprite_index = (self.animation_count // self.ANIMATION_DELAY) % len(sprites)
+        self.sprite = sprites[sprite_index]
+        # Masks are precomputed per frame, so switching frames is just a lookup
+        self.mask = self.MASKS[sprite_sheet_name][sprite_index]
         
         self.animation_count += 1
         self.update()
 
     def update(self):
         self.rect = self.sprite.get_rect(topleft=(self.rect.x, self.rect.y))
-        self.mask = pygame.mask.from_surface(self.sprite)
 
-    def draw(self, win, offset_x):
-        win.blit(self.sprite, (self.rect.x - offset_x, self.rect.y))
+    def draw(self, win, offset_x, alpha=1.0):
+        """Draw alpha of the way from the previous tick's position to the current one."""
+        rect = interpolated_rect(self.rect, self.prev_pos, alpha, self.SNAP_DISTANCE)
+        win.blit(self.sprite, (rect.x - offset_x, rect.y))
         
         # Wall slide indicator
         if self.wall_slide:
             pygame.draw.circle(win, (255, 255, 0), 
-                             (self.rect.centerx - offset_x, self.rect.centery), 30, 3)
+                             (rect.centerx - offset_x, rect.centery), 30, 3)
         
         # Dash cooldown indicator
         if self.dash_cooldown > 0:
@@ -435,130 +1084,635 @@ class Player(pygame.sprite.Sprite):
             dash_bar_height = 5
             dash_progress = (60 - self.dash_cooldown) / 60
             pygame.draw.rect(win, (255, 0, 0), 
-                           (self.rect.x - offset_x, self.rect.y - 10, dash_bar_width, dash_bar_height))
+                           (rect.x - offset_x, rect.y - 10, dash_bar_width, dash_bar_height))
             pygame.draw.rect(win, (0, 255, 0), 
-                           (self.rect.x - offset_x, self.rect.y - 10, dash_bar_width * dash_progress, dash_bar_height))
-
-class Object(pygame.sprite.Sprite):
-    def __init__(self, x, y, width, height, name=None):
-        super().__init__()
+                           (rect.x - offset_x, rect.y - 10, dash_bar_width * dash_progress, dash_bar_height))
+
+def shared_sprite(key, size, paint):
+    """The one (image, mask) pair for a visual type, painted on first use.
+
+    Objects that look alike hold this pair instead of private copies, so
+    neither the image nor the mask may be drawn on afterwards. An object
+    that changes its look switches to another shared pair.
+    """
+    def build():
+        image = pygame.Surface(size, pygame.SRCALPHA)
+        paint(image)
+        return image, make_mask(image)
+    return ASSETS.get_or_build(("sprite",) + key, build)
+
+class Category:
+    """Which LevelObjects bucket an entity class lives in, set as its CATEGORY."""
+    ENEMIES = "enemies"    # update(player_pos, projectiles) every awake tick
+    ANIMATED = "animated"  # loop() every awake tick
+    PICKUPS = "pickups"    # update() every awake tick, removed once collected
+    STATIC = "static"      # never simulated
+    # Blocks are kept in TerrainChunks and the TileMap instead of a bucket
+    TERRAIN = "terrain"
+
+    BUCKETS = (ENEMIES, ANIMATED, PICKUPS, STATIC)
+    # Buckets whose entities sleep and wake with the player's distance
+    SIMULATED = (ENEMIES, ANIMATED, PICKUPS)
+
+class Object:
+    """Level entity: a rect, an image and a mask, drawn at draw(win, offset_x).
+
+    Levels hold tens of thousands of these, so every class in the hierarchy
+    declares __slots__ and instances carry no __dict__. Collision helpers
+    such as pygame.sprite.collide_mask only need rect and mask, so Object
+    does not derive from Sprite.
+    """
+    __slots__ = ("rect", "image", "mask", "name", "last_tick")
+    CATEGORY = Category.STATIC
+
+    def __init__(self, x, y, width, height, name=None, image=None):
         self.rect = pygame.Rect(x, y, width, height)
-        self.image = pygame.Surface((width, height), pygame.SRCALPHA)
-        self.width = width
-        self.height = height
+        # Objects that all look alike pass in one shared image instead
+        self.image = pygame.Surface((width, height), pygame.SRCALPHA) if image is None else image
         self.name = name
+        # World tick this object was last simulated up to (see LevelObjects.wake)
+        self.last_tick = 0
 
-    def draw(self, win, offset_x):
+    @property
+    def width(self):
+        return self.rect.width
+
+    @property
+    def height(self):
+        return self.rect.height
+
+    def draw(self, win, offset_x, alpha=1.0):
         win.blit(self.image, (self.rect.x - offset_x, self.rect.y))
 
+    def remember_position(self):
+        """Note where the object is before a tick moves it; see MovingObject."""
+
+    def save_state(self):
+        """What to remember while this object's level chunk is unloaded."""
+        return self.rect.topleft
+
+    def restore_state(self, state):
+        self.rect.topleft = state
+
+    def fast_forward(self, ticks):
+        """Catch up on ticks missed while asleep, before the next update."""
+
+    def touch(self, events):
+        """Queue on events (a GameEvents) what the player touching this does."""
+
+class MovingObject(Object):
+    """Object that moves during ticks and is drawn between its last two positions."""
+    __slots__ = ("prev_pos",)
+    SNAP_DISTANCE = Player.SNAP_DISTANCE
+
+    def __init__(self, x, y, width, height, name=None, image=None):
+        super().__init__(x, y, width, height, name, image)
+        self.prev_pos = (x, y)
+
+    def draw(self, win, offset_x, alpha=1.0):
+        rect = interpolated_rect(self.rect, self.prev_pos, alpha, self.SNAP_DISTANCE)
+        win.blit(self.image, (rect.x - offset_x, rect.y))
+
+    def remember_position(self):
+        self.prev_pos = self.rect.topleft
+
 class Block(Object):
+    __slots__ = ()
+    CATEGORY = Category.TERRAIN
+
     def __init__(self, x, y, size):
-        super().__init__(x, y, size, size)
-        block = get_block(size)
-        self.image.blit(block, (0, 0))
-        self.mask = pygame.mask.from_surface(self.image)
+        image, self.mask = shared_sprite(("block", size), (size, size),
+                                         lambda image: image.blit(get_block(size), (0, 0)))
+        super().__init__(x, y, size, size, image=image)
+
+class Fruit(MovingObject):
+    __slots__ = ("fruit_type", "bob_offset", "bob_count", "prev_bob_y", "points")
+    CATEGORY = Category.PICKUPS
+    COLORS = {
+        "apple": (255, 0, 0),
+        "banana": (255, 255, 0),
+        "orange": (255, 165, 0),
+        "grape": (128, 0, 128)
+    }
 
-class Fruit(Object):
     def __init__(self, x, y, fruit_type="apple"):
-        super().__init__(x, y, 32, 32, "fruit")
-        self.fruit_type = fruit_type
-        
         # Create fruit sprite based on type
-        colors = {
-            "apple": (255, 0, 0),
-            "banana": (255, 255, 0),
-            "orange": (255, 165, 0),
-            "grape": (128, 0, 128)
-        }
-        
-        color = colors.get(fruit_type, (255, 0, 0))
-        pygame.draw.circle(self.image, color, (16, 16), 14)
-        pygame.draw.circle(self.image, (0, 255, 0), (16, 8), 4)  # Leaf
+        color = self.COLORS.get(fruit_type, (255, 0, 0))
+        image, self.mask = shared_sprite(("fruit", color), (32, 32), lambda image: self.paint(image, color))
+        super().__init__(x, y, 32, 32, "fruit", image)
+        self.fruit_type = fruit_type
         
-        self.mask = pygame.mask.from_surface(self.image)
-        self.bob_offset = random.uniform(0, math.pi * 2)
+        self.bob_offset = rng.uniform(0, math.pi * 2)
         self.bob_count = 0
+        self.prev_bob_y = 0
         self.points = 100
+
+    @staticmethod
+    def paint(image, color):
+        pygame.draw.circle(image, color, (16, 16), 14)
+        pygame.draw.circle(image, (0, 255, 0), (16, 8), 4)  # Leaf
         
     def update(self):
         self.bob_count += 0.1
         bob_y = math.sin(self.bob_count + self.bob_offset) * 5
-        new_y = self.rect.y + bob_y - getattr(self, 'prev_bob_y', 0)
+        new_y = self.rect.y + bob_y - self.prev_bob_y
         self.prev_bob_y = bob_y
         self.rect.y = new_y
 
+    def touch(self, events):
+        events.push(GameEvents.PICKUP, self)
+
+    def collect(self, game_state):
+        game_state.fruits_collected += 1
+        game_state.score += self.points
+
+    def save_state(self):
+        return self.rect.topleft, self.bob_offset, self.bob_count, self.prev_bob_y
+
+    def restore_state(self, state):
+        self.rect.topleft, self.bob_offset, self.bob_count, self.prev_bob_y = state
+
+    def fast_forward(self, ticks):
+        # Only the first update moves the rect: after that the bob changes
+        # by less than half a pixel per tick, which the Rect rounds away
+        if self.bob_count == 0:
+            self.update()
+            ticks -= 1
+        self.bob_count += 0.1 * ticks
+        self.prev_bob_y = math.sin(self.bob_count + self.bob_offset) * 5
+
 class HealthPotion(Object):
+    __slots__ = ("heal_amount",)
+    CATEGORY = Category.PICKUPS
+
     def __init__(self, x, y):
-        super().__init__(x, y, 24, 32, "health_potion")
-        # Draw health potion
-        pygame.draw.rect(self.image, (255, 0, 0), (6, 8, 12, 20))
-        pygame.draw.rect(self.image, (139, 69, 19), (8, 4, 8, 8))
-        pygame.draw.circle(self.image, (255, 255, 255), (12, 16), 3)
-        self.mask = pygame.mask.from_surface(self.image)
+        image, self.mask = shared_sprite(("health_potion",), (24, 32), self.paint)
+        super().__init__(x, y, 24, 32, "health_potion", image)
         self.heal_amount = 25
 
+    @staticmethod
+    def paint(image):
+        # Draw health potion
+        pygame.draw.rect(image, (255, 0, 0), (6, 8, 12, 20))
+        pygame.draw.rect(image, (139, 69, 19), (8, 4, 8, 8))
+        pygame.draw.circle(image, (255, 255, 255), (12, 16), 3)
+
+    def update(self):
+        pass  # Potions stand still
+
+    def touch(self, events):
+        events.push(GameEvents.PICKUP, self)
+
+    def collect(self, game_state):
+        game_state.heal(self.heal_amount)
+        game_state.score += 50
+
 class Checkpoint(Object):
+    __slots__ = ("activated",)
+
     def __init__(self, x, y):
-        super().__init__(x, y, 32, 64, "checkpoint")
-        # Draw checkpoint flag
-        pygame.draw.rect(self.image, (139, 69, 19), (4, 0, 4, 64))  # Pole
-        pygame.draw.rect(self.image, (255, 0, 0), (8, 8, 20, 12))  # Flag
-        self.mask = pygame.mask.from_surface(self.image)
+        image, self.mask = self.sprite((255, 0, 0))
+        super().__init__(x, y, 32, 64, "checkpoint", image)
         self.activated = False
 
+    @staticmethod
+    def sprite(flag_color):
+        def paint(image):
+            # Draw checkpoint flag
+            pygame.draw.rect(image, (139, 69, 19), (4, 0, 4, 64))  # Pole
+            pygame.draw.rect(image, flag_color, (8, 8, 20, 12))  # Flag
+        return shared_sprite(("checkpoint", flag_color), (32, 64), paint)
+
+    def touch(self, events):
+        if not self.activated:
+            events.push(GameEvents.CHECKPOINT, self)
+
+    def activate(self):
+        self.activated = True
+        # Change checkpoint appearance to a green flag, shared by every activated checkpoint
+        self.image, self.mask = self.sprite((0, 255, 0))
+
+    def save_state(self):
+        return self.rect.topleft, self.activated
+
+    def restore_state(self, state):
+        self.rect.topleft, activated = state
+        if activated:
+            self.activate()
+
 class LevelExit(Object):
+    __slots__ = ()
+
     def __init__(self, x, y):
-        super().__init__(x, y, 48, 96, "level_exit")
+        image, self.mask = shared_sprite(("level_exit",), (48, 96), self.paint)
+        super().__init__(x, y, 48, 96, "level_exit", image)
+
+    def touch(self, events):
+        events.push(GameEvents.EXIT, self)
+
+    @staticmethod
+    def paint(image):
         # Draw exit flag
-        pygame.draw.rect(self.image, (139, 69, 19), (8, 0, 8, 96))  # Pole
-        pygame.draw.rect(self.image, (0, 255, 0), (16, 16, 28, 20))  # Flag
-        self.mask = pygame.mask.from_surface(self.image)
+        pygame.draw.rect(image, (139, 69, 19), (8, 0, 8, 96))  # Pole
+        pygame.draw.rect(image, (0, 255, 0), (16, 16, 28, 20))  # Flag
 
 class Projectile(Object):
+    __slots__ = ("speed", "direction")
+    # Health lost when one hits the player
+    DAMAGE = 15
+
     def __init__(self, x, y, direction, speed=8):
-        super().__init__(x, y, 12, 6, "projectile")
-        pygame.draw.ellipse(self.image, (255, 100, 0), (0, 0, 12, 6))
-        self.mask = pygame.mask.from_surface(self.image)
+        image, self.mask = shared_sprite(("projectile",), (12, 6),
+                                         lambda image: pygame.draw.ellipse(image, (255, 100, 0), (0, 0, 12, 6)))
+        super().__init__(x, y, 12, 6, "projectile", image)
+        self.reset(x, y, direction, speed)
+
+    def reset(self, x, y, direction, speed=8):
+        """Reuse this projectile for a new shot; see Pool."""
+        self.rect.topleft = (x, y)
         self.speed = speed
         self.direction = direction
+        return self
         
     def update(self):
         self.rect.x += self.speed * self.direction
 
-class Enemy(Object):
+    def sweep_hit(self, sprite):
+        """Whether this tick's flight path crossed sprite's mask.
+
+        Positions along the path are tested earliest first, no further
+        apart than the projectile is wide, so a fast shot cannot skip
+        through. At normal speed that is just the current position.
+        """
+        travel = self.speed * self.direction
+        steps = math.ceil(abs(travel) / self.rect.width)
+        x = self.rect.x
+        try:
+            for step in range(steps - 1, -1, -1):
+                self.rect.x = x - travel * step / steps
+                if collide_mask(sprite, self):
+                    return True
+            return False
+        finally:
+            self.rect.x = x
+
+class Pool:
+    """Fixed-capacity free list of reusable instances of one class.
+
+    acquire() hands back a released instance, re-initialised through its
+    reset() method, and only calls factory when none is free. At most
+    capacity instances are live at once; past that acquire() returns None
+    and the shortfall is counted in stats["overflow"] instead.
+    """
+
+    def __init__(self, factory, capacity):
+        self.factory = factory
+        self.capacity = capacity
+        self.free = []
+        self.live = 0
+        self.stats = {"created": 0, "reused": 0, "released": 0, "overflow": 0, "peak": 0}
+
+    def acquire(self, *args):
+        if not self.add():
+            return None
+        if self.free:
+            self.stats["reused"] += 1
+            return self.free.pop().reset(*args)
+        self.stats["created"] += 1
+        return self.factory(*args)
+
+    def add(self):
+        """Count one more live instance (acquired or built elsewhere), if there is room."""
+        if self.live >= self.capacity:
+            self.stats["overflow"] += 1
+            return False
+        self.live += 1
+        self.stats["peak"] = max(self.stats["peak"], self.live)
+        return True
+
+    def release(self, obj):
+        self.live -= 1
+        self.stats["released"] += 1
+        self.free.append(obj)
+
+class ProjectileStore:
+    """Projectiles held as a struct of arrays so they move and cull as one batch.
+
+    With NumPy, positions, velocities and sizes live in arrays and a tick is
+    a few vector operations. The Projectile objects only get their rects
+    brought up to date when something looks at them: drawing, hitting the
+    player or iterating over the store. Without NumPy the same interface
+    updates each projectile in turn.
+
+    Capacity is fixed. Projectiles come from and go back to a Pool, so
+    firing allocates nothing once the pool is warm. Shots past capacity are
+    dropped and counted in pool.stats["overflow"].
+    """
+    # Anything further than this past the edges of the screen is dropped
+    CULL_MARGIN = 50
+    CAPACITY = 1024
+
+    def __init__(self, projectiles=(), capacity=CAPACITY):
+        self.count = 0
+        self.pool = Pool(Projectile, capacity)
+        if np is not None:
+            self.items = np.empty(capacity, dtype=object)
+            self.x = np.empty(capacity)
+            self.y = np.empty(capacity)
+            self.vx = np.empty(capacity)
+            self.w = np.empty(capacity)
+            self.h = np.empty(capacity)
+        else:
+            self.items = []
+        for projectile in projectiles:
+            self.append(projectile)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if np is None:
+            return iter(list(self.items))
+        return iter(self.synced(np.arange(self.count)))
+
+    def columns(self):
+        return self.items, self.x, self.y, self.vx, self.w, self.h
+
+    def spawn(self, x, y, direction, speed=8):
+        """Fire a pooled projectile; returns None when the store is full."""
+        projectile = self.pool.acquire(x, y, direction, speed)
+        if projectile is not None:
+            self.insert(projectile)
+        return projectile
+
+    def append(self, projectile):
+        """Add a projectile built elsewhere; it joins the pool once removed."""
+        if self.pool.add():
+            self.insert(projectile)
+
+    def insert(self, projectile):
+        if np is None:
+            self.items.append(projectile)
+            self.count += 1
+            return
+        n = self.count
+        rect = projectile.rect
+        self.items[n] = projectile
+        self.x[n], self.y[n] = rect.x, rect.y
+        self.vx[n] = projectile.speed * projectile.direction
+        self.w[n], self.h[n] = rect.width, rect.height
+        self.count = n + 1
+
+    def retain(self, keep):
+        """Drop every projectile whose entry in the boolean array keep is False."""
+        n = self.count
+        for projectile in self.items[:n][~keep]:
+            self.pool.release(projectile)
+        indexes = np.flatnonzero(keep)
+        kept = len(indexes)
+        for column in self.columns():
+            column[:kept] = column[indexes]
+        self.items[kept:n] = None
+        self.count = kept
+
+    def retain_items(self, keep):
+        """retain() for the list kept when NumPy is missing."""
+        for projectile, kept in zip(self.items, keep):
+            if not kept:
+                self.pool.release(projectile)
+        self.items[:] = [p for p, kept in zip(self.items, keep) if kept]
+        self.count = len(self.items)
+
+    def synced(self, indexes):
+        """Projectiles at indexes, with their rects moved to the stored positions."""
+        items = self.items[indexes]
+        for projectile, x in zip(items, self.x[indexes].tolist()):
+            projectile.rect.x = int(x)
+        return list(items)
+
+    def update(self):
+        low, high = -self.CULL_MARGIN, WIDTH + self.CULL_MARGIN
+        if np is None:
+            for projectile in self.items:
+                projectile.update()
+            self.retain_items([low <= p.rect.x <= high for p in self.items])
+            return
+
+        n = self.count
+        if not n:
+            return
+        x = self.x[:n]
+        x += self.vx[:n]
+        # Same rounding as assigning a float to Rect.x: half away from zero
+        np.copysign(np.floor(np.abs(x) + 0.5), x, out=x)
+        keep = (x >= low) & (x <= high)
+        if not keep.all():
+            self.retain(keep)
+
+    def visible(self, offset_x, width=WIDTH):
+        """Projectiles at least partly inside the view starting at offset_x."""
+        if np is None:
+            return [p for p in self.items if -p.rect.width < p.rect.x - offset_x < width]
+        n = self.count
+        if not n:
+            return []
+        screen_x = self.x[:n] - offset_x
+        return self.synced(np.flatnonzero((screen_x > -self.w[:n]) & (screen_x < width)))
+
+    def fast(self):
+        """Whether any projectile moves further than its width per tick."""
+        if np is None:
+            return any(abs(p.speed) > p.rect.width for p in self.items)
+        n = self.count
+        return n > 0 and bool((np.abs(self.vx[:n]) > self.w[:n]).any())
+
+    def collide(self, sprite, swept=False):
+        """Remove and return the projectiles whose masks overlap sprite's, in order.
+
+        With swept, a projectile also hits if its path over the last tick
+        crossed sprite (see Projectile.sweep_hit).
+        """
+        if swept:
+            hit = lambda projectile: projectile.sweep_hit(sprite)
+        else:
+            hit = lambda projectile: collide_mask(sprite, projectile)
+        if np is None:
+            keep = [not hit(p) for p in self.items]
+            hits = [p for p, kept in zip(self.items, keep) if not kept]
+            if hits:
+                self.retain_items(keep)
+            return hits
+
+        # Rect overlap first, so only the projectiles touching sprite get a mask test
+        n, rect = self.count, sprite.rect
+        if not n:
+            return []
+        x, y = self.x[:n], self.y[:n]
+        left = np.minimum(x, x - self.vx[:n]) if swept else x
+        right = (np.maximum(x, x - self.vx[:n]) if swept else x) + self.w[:n]
+        candidates = np.flatnonzero((left < rect.right) & (right > rect.left) &
+                                    (y < rect.bottom) & (y + self.h[:n] > rect.top))
+        hits = []
+        keep = None
+        for index, projectile in zip(candidates.tolist(), self.synced(candidates)):
+            if hit(projectile):
+                hits.append(projectile)
+                if keep is None:
+                    keep = np.ones(n, dtype=bool)
+                keep[index] = False
+        if keep is not None:
+            self.retain(keep)
+        return hits
+
+def load_effect_frames(kind):
+    sheet, size = Effect.KINDS[kind][:2]
+    try:
+        return ASSETS.frames(join("assets", "Other", sheet), size, size)
+    except:
+        # Fallback: a plain puff
+        surface = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        pygame.draw.circle(surface, (230, 230, 230, 180), (size, size), size)
+        return [surface]
+
+class Effect(MovingObject):
+    """Short-lived animation with no collision, such as dust or confetti."""
+    __slots__ = ("frames", "lifetime", "drift", "age", "x", "y")
+    ANIMATION_DELAY = 3
+    KINDS = {
+        # kind: (sheet in assets/Other, frame size, lifetime in ticks, drift per tick)
+        "dust": ("Dust Particle.png", 16, 18, (0, -0.5)),
+        "confetti": ("Confetti (16x16).png", 16, 18, (0, -1)),
+    }
+
+    def __init__(self, kind, x, y):
+        frames = ASSETS.get_or_build(("effect", kind), lambda: load_effect_frames(kind))
+        super().__init__(x, y, *frames[0].get_size(), kind, frames[0])
+        self.reset(kind, x, y)
+
+    def reset(self, kind, x, y):
+        """Restart as a new effect; see Pool."""
+        self.frames = ASSETS.get_or_build(("effect", kind), lambda: load_effect_frames(kind))
+        self.name = kind
+        self.image = self.frames[0]
+        _, _, self.lifetime, self.drift = self.KINDS[kind]
+        self.age = 0
+        self.x, self.y = x, y
+        self.rect.topleft = self.prev_pos = (x, y)
+        return self
+
+    def update(self):
+        """Advance one tick; returns False once the effect has finished."""
+        self.age += 1
+        self.x += self.drift[0]
+        self.y += self.drift[1]
+        self.rect.topleft = (self.x, self.y)
+        self.image = self.frames[(self.age // self.ANIMATION_DELAY) % len(self.frames)]
+        return self.age < self.lifetime
+
+class Effects:
+    """The live Effects of a level, recycled through a fixed-capacity Pool.
+
+    Nothing in the game spawns effects yet. An owner calls
+    remember_positions() and update() once per tick and draw() every frame.
+    """
+    CAPACITY = 64
+
+    def __init__(self, capacity=CAPACITY):
+        self.pool = Pool(Effect, capacity)
+        self.live = []
+
+    def __len__(self):
+        return len(self.live)
+
+    def spawn(self, kind, x, y):
+        effect = self.pool.acquire(kind, x, y)
+        if effect is not None:
+            self.live.append(effect)
+        return effect
+
+    def remember_positions(self):
+        for effect in self.live:
+            effect.remember_position()
+
+    def update(self):
+        live = []
+        for effect in self.live:
+            if effect.update():
+                live.append(effect)
+            else:
+                self.pool.release(effect)
+        self.live = live
+
+    def draw(self, win, offset_x, alpha=1.0):
+        for effect in self.live:
+            effect.draw(win, offset_x, alpha)
+
+class Enemy(MovingObject):
+    __slots__ = ("enemy_type", "start_x", "direction", "shoot_cooldown", "move_range", "speed", "jump_timer")
+    CATEGORY = Category.ENEMIES
+    COLORS = {"walker": (150, 0, 0), "shooter": (0, 150, 0), "jumper": (0, 0, 150)}
+    # Health lost by touching one
+    DAMAGE = 25
+
     def __init__(self, x, y, width, height, enemy_type="walker"):
-        super().__init__(x, y, width, height, f"enemy_{enemy_type}")
+        def paint(image):
+            if enemy_type in self.COLORS:
+                image.fill(self.COLORS[enemy_type])
+        image, self.mask = shared_sprite(("enemy", enemy_type, width, height), (width, height), paint)
+        super().__init__(x, y, width, height, f"enemy_{enemy_type}", image)
         self.enemy_type = enemy_type
         self.start_x = x
         self.direction = 1
         self.shoot_cooldown = 0
         
         if enemy_type == "walker":
-            self.image.fill((150, 0, 0))
             self.move_range = 150
             self.speed = 1
         elif enemy_type == "shooter":
-            self.image.fill((0, 150, 0))
             self.move_range = 100
             self.speed = 0.5
         elif enemy_type == "jumper":
-            self.image.fill((0, 0, 150))
             self.move_range = 200
             self.speed = 2
             self.jump_timer = 0
-        
-        self.mask = pygame.mask.from_surface(self.image)
+
+    def save_state(self):
+        return self.rect.topleft, self.direction, self.shoot_cooldown
+
+    def restore_state(self, state):
+        self.rect.topleft, self.direction, self.shoot_cooldown = state
+
+    def touch(self, events):
+        events.push(GameEvents.CONTACT, self, self.DAMAGE)
+
+    def patrol(self):
+        self.rect.x += self.speed * self.direction
+        if self.rect.x >= self.start_x + self.move_range or self.rect.x <= self.start_x:
+            self.direction *= -1
+
+    def fast_forward(self, ticks):
+        # Asleep means the player is too far away to be shot at, so only the
+        # patrol and the cooldown advance. The patrol is periodic in
+        # (x, direction): step until a state repeats, then skip whole cycles.
+        if self.enemy_type == "shooter":
+            self.shoot_cooldown -= ticks
+        seen = {}
+        while ticks > 0:
+            state = (self.rect.x, self.direction)
+            if state in seen:
+                ticks %= seen[state] - ticks
+                seen = {}
+                continue
+            seen[state] = ticks
+            self.patrol()
+            ticks -= 1
         
     def update(self, player_pos, projectiles):
         if self.enemy_type == "walker":
-            self.rect.x += self.speed * self.direction
-            if self.rect.x >= self.start_x + self.move_range or self.rect.x <= self.start_x:
-                self.direction *= -1
+            self.patrol()
                 
         elif self.enemy_type == "shooter":
-            self.rect.x += self.speed * self.direction
-            if self.rect.x >= self.start_x + self.move_range or self.rect.x <= self.start_x:
-                self.direction *= -1
+            self.patrol()
             
             # Shoot at player
             self.shoot_cooldown -= 1
@@ -566,49 +1720,71 @@ class Enemy(Object):
                 player_distance = abs(player_pos[0] - self.rect.centerx)
                 if player_distance < 300:  # Shoot if player is close
                     shoot_direction = 1 if player_pos[0] > self.rect.centerx else -1
-                    projectile = Projectile(self.rect.centerx, self.rect.centery, shoot_direction)
-                    projectiles.append(projectile)
+                    if isinstance(projectiles, ProjectileStore):
+                        fired = projectiles.spawn(self.rect.centerx, self.rect.centery, shoot_direction)
+                    else:
+                        fired = Projectile(self.rect.centerx, self.rect.centery, shoot_direction)
+                        projectiles.append(fired)
                     self.shoot_cooldown = 120  # 2 seconds at 60 FPS
-                    if shoot_sound:
-                        shoot_sound.play()
+                    if fired is not None:
+                        AUDIO.play("shoot")
                         
         elif self.enemy_type == "jumper":
-            self.rect.x += self.speed * self.direction
-            if self.rect.x >= self.start_x + self.move_range or self.rect.x <= self.start_x:
-                self.direction *= -1
+            self.patrol()
 
 class Fire(Object):
+    __slots__ = ("fire", "fire_masks", "animation_count", "animation_name")
+    CATEGORY = Category.ANIMATED
     ANIMATION_DELAY = 3
+    # Health lost by touching it
+    DAMAGE = 25
 
     def __init__(self, x, y, width, height):
-        super().__init__(x, y, width, height, "fire")
         try:
             self.fire = load_sprite_sheets("Traps", "Fire", width, height)
-            if self.fire:
-                self.image = self.fire["off"][0] if "off" in self.fire else list(self.fire.values())[0][0]
-            else:
+            self.fire_masks = load_sprite_masks("Traps", "Fire", width, height)
+            if not self.fire:
                 # Fallback fire animation
-                self.create_fallback_fire()
+                self.create_fallback_fire(width, height)
         except:
-            self.create_fallback_fire()
+            self.create_fallback_fire(width, height)
         
-        self.mask = pygame.mask.from_surface(self.image)
+        # Frames and masks are shared with every other fire of this size
+        first = "off" if "off" in self.fire else next(iter(self.fire))
+        super().__init__(x, y, width, height, "fire", self.fire[first][0])
+        self.mask = self.fire_masks[first][0]
         self.animation_count = 0
         self.animation_name = "off"
 
-    def create_fallback_fire(self):
+    def create_fallback_fire(self, width, height):
         self.fire = {"on": [], "off": []}
         # Create simple fire animation
         for i in range(4):
-            surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-            height_var = random.randint(-2, 2)
+            surface = pygame.Surface((width, height), pygame.SRCALPHA)
+            height_var = rng.randint(-2, 2)
             pygame.draw.rect(surface, (255, 100 + i * 30, 0), 
-                           (0, height_var, self.width, self.height - height_var))
+                           (0, height_var, width, height - height_var))
             self.fire["on"].append(surface)
         
         # Off state
-        surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
         self.fire["off"] = [surface]
+        self.fire_masks = build_masks(self.fire)
+
+    def save_state(self):
+        return self.rect.topleft, self.animation_name, self.animation_count
+
+    def restore_state(self, state):
+        self.rect.topleft, self.animation_name, self.animation_count = state
+
+    def fast_forward(self, ticks):
+        if self.fire and self.animation_name in self.fire:
+            # loop() wraps the count back to 0 once it reaches this
+            period = self.ANIMATION_DELAY * (len(self.fire[self.animation_name]) + 1)
+            self.animation_count = (self.animation_count + ticks) % period
+
+    def touch(self, events):
+        events.push(GameEvents.CONTACT, self, self.DAMAGE)
 
     def on(self):
         self.animation_name = "on"
@@ -621,191 +1797,846 @@ class Fire(Object):
             sprites = self.fire[self.animation_name]
             sprite_index = (self.animation_count // self.ANIMATION_DELAY) % len(sprites)
             self.image = sprites[sprite_index]
+            self.mask = self.fire_masks[self.animation_name][sprite_index]
             self.animation_count += 1
 
             self.rect = self.image.get_rect(topleft=(self.rect.x, self.rect.y))
-            self.mask = pygame.mask.from_surface(self.image)
 
             if self.animation_count // self.ANIMATION_DELAY > len(sprites):
                 self.animation_count = 0
 
-def create_level(level_num):
-    block_size = 96
-    objects = []
-    projectiles = []
-    
-    if level_num == 1:
-        # Level 1: Basic platforming
-        # Floor
-        floor = [Block(i * block_size, HEIGHT - block_size, block_size)
-                 for i in range(-WIDTH // block_size, (WIDTH * 4) // block_size)]
-        objects.extend(floor)
-        
-        # Platforms
-        objects.append(Block(block_size * 3, HEIGHT - block_size * 3, block_size))
-        objects.append(Block(block_size * 6, HEIGHT - block_size * 4, block_size))
-        objects.append(Block(block_size * 9, HEIGHT - block_size * 2, block_size))
-        
-        # Fruits
-        objects.append(Fruit(block_size * 2, HEIGHT - block_size * 2, "apple"))
-        objects.append(Fruit(block_size * 5, HEIGHT - block_size * 5, "banana"))
-        objects.append(Fruit(block_size * 8, HEIGHT - block_size * 3, "orange"))
-        
-        # Health potion
-        objects.append(HealthPotion(block_size * 4, HEIGHT - block_size * 4))
-        
-        # Simple enemy
-        objects.append(Enemy(block_size * 7, HEIGHT - block_size - 40, 40, 40, "walker"))
-        
-        # Level exit
-        objects.append(LevelExit(block_size * 12, HEIGHT - block_size * 2))
-        
-    elif level_num == 2:
-        # Level 2: More challenging with checkpoint
-        # Floor with gaps
-        floor_sections = [
-            range(-WIDTH // block_size, 3),
-            range(5, 10),
-            range(12, 20),
-            range(22, 30)
-        ]
-        for section in floor_sections:
-            for i in section:
-                objects.append(Block(i * block_size, HEIGHT - block_size, block_size))
-        
-        # Vertical wall sections for wall jumping
-        for i in range(3):
-            objects.append(Block(block_size * 4, HEIGHT - block_size * (2 + i), block_size))
-            objects.append(Block(block_size * 11, HEIGHT - block_size * (2 + i), block_size))
-        
-        # Higher platforms
-        objects.append(Block(block_size * 15, HEIGHT - block_size * 6, block_size))
-        objects.append(Block(block_size * 18, HEIGHT - block_size * 4, block_size))
-        
-        # Checkpoint
-        objects.append(Checkpoint(block_size * 13, HEIGHT - block_size * 2))
-        
-        # Enemies
-        objects.append(Enemy(block_size * 6, HEIGHT - block_size - 40, 40, 40, "shooter"))
-        objects.append(Enemy(block_size * 16, HEIGHT - block_size - 40, 40, 40, "walker"))
-        
-        # Fruits
-        objects.append(Fruit(block_size * 8, HEIGHT - block_size * 2, "grape"))
-        objects.append(Fruit(block_size * 14, HEIGHT - block_size * 7, "apple"))
-        objects.append(Fruit(block_size * 19, HEIGHT - block_size * 5, "banana"))
-        
-        # Health potions
-        objects.append(HealthPotion(block_size * 10, HEIGHT - block_size * 2))
-        objects.append(HealthPotion(block_size * 17, HEIGHT - block_size * 7))
-        
-        # Fire hazard
-        fire = Fire(block_size * 21, HEIGHT - block_size - 64, 16, 32)
-        fire.on()
-        objects.append(fire)
-        
-        # Level exit
-        objects.append(LevelExit(block_size * 25, HEIGHT - block_size * 2))
-        
-    elif level_num == 3:
-        # Level 3: Advanced level with all mechanics
-        # Complex floor layout
-        floor_sections = [
-            range(-WIDTH // block_size, 2),
-            range(4, 8),
-            range(10, 15),
-            range(17, 22),
-            range(24, 35)
-        ]
-        for section in floor_sections:
-            for i in section:
-                objects.append(Block(i * block_size, HEIGHT - block_size, block_size))
-        
-        # Multi-level platforms and walls for wall jumping
-        # Left wall section
-        for i in range(5):
-            objects.append(Block(block_size * 3, HEIGHT - block_size * (2 + i), block_size))
-        
-        # Middle wall sections
-        for i in range(4):
-            objects.append(Block(block_size * 9, HEIGHT - block_size * (3 + i), block_size))
-            objects.append(Block(block_size * 16, HEIGHT - block_size * (2 + i), block_size))
-        
-        # High platforms
-        objects.append(Block(block_size * 6, HEIGHT - block_size * 8, block_size))
-        objects.append(Block(block_size * 12, HEIGHT - block_size * 7, block_size))
-        objects.append(Block(block_size * 19, HEIGHT - block_size * 6, block_size))
-        objects.append(Block(block_size * 26, HEIGHT - block_size * 4, block_size))
-        
-        # Checkpoint
-        objects.append(Checkpoint(block_size * 20, HEIGHT - block_size * 7))
-        
-        # Multiple enemy types
-        objects.append(Enemy(block_size * 5, HEIGHT - block_size - 40, 40, 40, "walker"))
-        objects.append(Enemy(block_size * 11, HEIGHT - block_size - 40, 40, 40, "shooter"))
-        objects.append(Enemy(block_size * 18, HEIGHT - block_size - 40, 40, 40, "jumper"))
-        objects.append(Enemy(block_size * 27, HEIGHT - block_size - 40, 40, 40, "shooter"))
-        
-        # Multiple fire hazards
-        fire1 = Fire(block_size * 8, HEIGHT - block_size - 64, 16, 32)
-        fire1.on()
-        objects.append(fire1)
-        
-        fire2 = Fire(block_size * 23, HEIGHT - block_size - 64, 16, 32)
-        fire2.on()
-        objects.append(fire2)
-        
-        # Fruits scattered throughout
-        fruits_data = [
-            (block_size * 2, HEIGHT - block_size * 2, "apple"),
-            (block_size * 7, HEIGHT - block_size * 9, "banana"),
-            (block_size * 13, HEIGHT - block_size * 8, "orange"),
-            (block_size * 15, HEIGHT - block_size * 3, "grape"),
-            (block_size * 21, HEIGHT - block_size * 8, "apple"),
-            (block_size * 28, HEIGHT - block_size * 5, "banana")
-        ]
-        
-        for x, y, fruit_type in fruits_data:
-            objects.append(Fruit(x, y, fruit_type))
-        
-        # Health potions
-        objects.append(HealthPotion(block_size * 4, HEIGHT - block_size * 6))
-        objects.append(HealthPotion(block_size * 14, HEIGHT - block_size * 4))
-        objects.append(HealthPotion(block_size * 25, HEIGHT - block_size * 2))
-        
-        # Level exit
-        objects.append(LevelExit(block_size * 32, HEIGHT - block_size * 2))
-    
-    return objects, projectiles
+# Set to False to fall back to scanning every object (useful for checking the grid)
+USE_SPATIAL_GRID = True
+
+class SpatialGrid:
+    """Uniform grid over object rects for broadphase collision queries."""
+
+    def __init__(self, cell_size=96):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}  # obj -> (cell range, level order)
+        self.counter = 0
+
+    def cell_range(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def insert(self, obj, order=None):
+        """Add obj; order is its place in the level, defaulting to insertion order."""
+        cells = self.cell_range(obj.rect)
+        if order is None:
+            order = self.counter
+            self.counter += 1
+        self.entries[obj] = (cells, order)
+        self.add_to_cells(obj, cells)
+
+    def order(self, obj):
+        return self.entries[obj][1]
+
+    def remove(self, obj):
+        cells, _ = self.entries.pop(obj)
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells[(cx, cy)]
+                bucket.discard(obj)
+                if not bucket:
+                    del self.cells[(cx, cy)]
+
+    def move(self, obj):
+        cells, order = self.entries[obj]
+        new_cells = self.cell_range(obj.rect)
+        if new_cells != cells:
+            self.remove(obj)
+            self.entries[obj] = (new_cells, order)
+            self.add_to_cells(obj, new_cells)
+
+    def add_to_cells(self, obj, cells):
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(obj)
+
+    def query(self, rect):
+        """Objects whose cells overlap rect, in the order they were added."""
+        found = set()
+        x0, y0, x1, y1 = self.cell_range(rect)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        # Keep list order so results match a linear scan of the level
+        return sorted(found, key=lambda obj: self.entries[obj][1])
+
+    def scan(self, sprite):
+        """Yield objects near sprite.rect in the order they were added.
+
+        Collision response may move the sprite between steps, so candidates
+        are refreshed whenever its rect changes. The result is the same as
+        a linear scan over every object.
+        """
+        rect = sprite.rect.copy()
+        candidates = self.query(rect)
+        i = 0
+        while i < len(candidates):
+            obj = candidates[i]
+            i += 1
+            yield obj
+            if sprite.rect != rect:
+                order = self.entries[obj][1]
+                rect = sprite.rect.copy()
+                candidates = [other for other in self.query(rect) if self.entries[other][1] > order]
+                i = 0
+
+class TerrainChunks:
+    """Static Block geometry pre-rendered into one surface per chunk of level width.
+
+    Chunks are baked the first time they scroll into view and dropped again
+    once they are more than keep_distance chunks away from the viewport.
+    """
+
+    def __init__(self, chunk_width=WIDTH, keep_distance=2):
+        self.chunk_width = chunk_width
+        self.keep_distance = keep_distance
+        self.blocks = {}  # chunk index -> blocks overlapping it
+        self.baked = {}   # chunk index -> (surface, top) or None when empty
+
+    def chunk_span(self, rect):
+        return range(rect.left // self.chunk_width, (rect.right - 1) // self.chunk_width + 1)
+
+    def add(self, block):
+        for index in self.chunk_span(block.rect):
+            self.blocks.setdefault(index, []).append(block)
+            self.baked.pop(index, None)
+
+    def remove(self, block):
+        for index in self.chunk_span(block.rect):
+            self.blocks[index].remove(block)
+            self.baked.pop(index, None)
+
+    def bake(self, index):
+        blocks = self.blocks.get(index)
+        if not blocks:
+            return None
+
+        top = min(block.rect.top for block in blocks)
+        bottom = max(block.rect.bottom for block in blocks)
+        surface = pygame.Surface((self.chunk_width, bottom - top), pygame.SRCALPHA)
+        left = index * self.chunk_width
+        for block in blocks:
+            surface.blit(block.image, (block.rect.x - left, block.rect.y - top))
+        if pygame.display.get_surface():
+            surface = surface.convert_alpha()
+        # RLE lets the blit skip the transparent space around the blocks
+        surface.set_alpha(255, pygame.RLEACCEL)
+        return surface, top
+
+    def draw(self, win, offset_x):
+        first = math.floor(offset_x / self.chunk_width)
+        last = math.floor((offset_x + win.get_width() - 1) / self.chunk_width)
+        for index in range(first, last + 1):
+            if index not in self.baked:
+                self.baked[index] = self.bake(index)
+            chunk = self.baked[index]
+            if chunk:
+                surface, top = chunk
+                win.blit(surface, (math.floor(index * self.chunk_width - offset_x), top))
+
+        for index in list(self.baked):
+            if index < first - self.keep_distance or index > last + self.keep_distance:
+                del self.baked[index]
+
+def pixel_step(rect, dx, dy):
+    """Whole pixels rect moves by for a float (dx, dy), rounded the same way Player.move() does."""
+    x, y = rect.x, rect.y
+    rect.x += dx
+    rect.y += dy
+    step = rect.x - x, rect.y - y
+    rect.topleft = (x, y)
+    return step
+
+class TileMap:
+    """Solid terrain as a set of occupied cells on the block grid.
+
+    Used by the "tiles" collision mode. Moving boxes are swept one axis at
+    a time, checking only the cells their leading edge crosses, so there
+    are no pixel tests against terrain and a fast box cannot skip through
+    a wall.
+    """
+
+    def __init__(self, cell_size=96):
+        self.cell_size = cell_size
+        # Grid offset, taken from the first block (levels rest on the bottom of the screen)
+        self.origin = None
+        self.solid = {}  # (column, row) -> number of blocks covering it
+
+    def span(self, start, end, origin):
+        """Cells covering the pixels start..end-1 along one axis."""
+        size = self.cell_size
+        return range((start - origin) // size, (end - 1 - origin) // size + 1)
+
+    def cells(self, rect):
+        ox, oy = self.origin
+        for column in self.span(rect.left, rect.right, ox):
+            for row in self.span(rect.top, rect.bottom, oy):
+                yield column, row
+
+    def add(self, block):
+        if self.origin is None:
+            self.origin = (block.rect.x % self.cell_size, block.rect.y % self.cell_size)
+        for cell in self.cells(block.rect):
+            self.solid[cell] = self.solid.get(cell, 0) + 1
+
+    def remove(self, block):
+        for cell in self.cells(block.rect):
+            self.solid[cell] -= 1
+            if not self.solid[cell]:
+                del self.solid[cell]
+
+    def sweep_x(self, box, dx):
+        """How much of an integer move dx box can make before touching a solid cell."""
+        if not dx or self.origin is None:
+            return dx
+        size, solid = self.cell_size, self.solid
+        ox, oy = self.origin
+        rows = self.span(box.top, box.bottom, oy)
+        if dx > 0:
+            for column in self.span(box.right, box.right + dx, ox):
+                if any((column, row) in solid for row in rows):
+                    return max(0, ox + column * size - box.right)
+        else:
+            for column in reversed(self.span(box.left + dx, box.left, ox)):
+                if any((column, row) in solid for row in rows):
+                    return min(0, ox + (column + 1) * size - box.left)
+        return dx
+
+    def sweep_y(self, box, dy):
+        """sweep_x() for a vertical move."""
+        if not dy or self.origin is None:
+            return dy
+        size, solid = self.cell_size, self.solid
+        ox, oy = self.origin
+        columns = self.span(box.left, box.right, ox)
+        if dy > 0:
+            for row in self.span(box.bottom, box.bottom + dy, oy):
+                if any((column, row) in solid for column in columns):
+                    return max(0, oy + row * size - box.bottom)
+        else:
+            for row in reversed(self.span(box.top + dy, box.top, oy)):
+                if any((column, row) in solid for column in columns):
+                    return min(0, oy + (row + 1) * size - box.top)
+        return dy
+
+    def move(self, player, dx, dy):
+        """Player.move() that stops the player's hitbox at solid cells, x first then y."""
+        rect = player.rect
+        step_x, step_y = pixel_step(rect, dx, dy)
+
+        allowed = self.sweep_x(player.hitbox(), step_x)
+        rect.x += allowed
+        if allowed != step_x:
+            player.x_vel = 0
+
+        box = player.hitbox()
+        allowed = self.sweep_y(box, step_y)
+        rect.y += allowed
+        if dy >= 0 and self.sweep_y(box.move(0, allowed), 1) == 0:
+            # Standing on (or just landed on) the ground
+            player.landed()
+        elif allowed != step_y:
+            player.hit_head()
+
+    def blocked(self, box, dx):
+        """Whether a solid cell lies within dx pixels of box horizontally."""
+        return self.sweep_x(box, dx) != dx
+
+class SubstepMover:
+    """Moves the player in sub-steps so a fast move cannot skip geometry.
+
+    The step count comes from the speed: a move of at most MAX_STEP pixels
+    per axis is a single plain Player.move(), so walking costs nothing
+    extra. A faster move advances x and then y in sub-steps. At the first
+    sub-step that overlaps something, it bisects back to the first pixel
+    of contact.
+
+    - Horizontally, Blocks stop the player one pixel short and zero x_vel.
+      Hazards and pickups are passed through and recorded in player.swept.
+    - Vertically, the player stops at the first pixel of overlap with
+      anything, so handle_move() lands it or bumps its head as usual.
+
+    With a TileMap, terrain is already swept exactly, so only the hazards
+    and pickups along the path are sampled.
+    """
+    # Half the width of the narrowest thing the player can touch (16 px fire)
+    MAX_STEP = 8
+
+    def __init__(self, objects, tiles=None):
+        self.objects = objects
+        self.tiles = tiles
+
+    def steps(self, distance):
+        return max(1, math.ceil(abs(distance) / self.MAX_STEP))
+
+    def move(self, player, dx, dy):
+        if abs(dx) <= self.MAX_STEP and abs(dy) <= self.MAX_STEP:
+            if self.tiles is None:
+                player.move(dx, dy)
+            else:
+                self.tiles.move(player, dx, dy)
+            return
+
+        rect = player.rect
+        x, y = rect.x, rect.y
+        if self.tiles is not None:
+            self.tiles.move(player, dx, dy)
+            self.sample(player, x, y, rect.x, rect.y)
+            return
+
+        step_x, step_y = pixel_step(rect, dx, dy)
+        if self.advance(player, 0, step_x, blocks_only=True) is not None:
+            player.x_vel = 0
+        self.advance(player, 1, step_y, blocks_only=False)
+
+    def hits(self, player, blocks_only):
+        """The first object player overlaps, noting hazards and pickups on the way."""
+        for obj in nearby(self.objects, player):
+            if collide_mask(player, obj):
+                if not blocks_only or isinstance(obj, Block):
+                    return obj
+                if obj not in player.swept:
+                    player.swept.append(obj)
+        return None
+
+    def advance(self, player, axis, distance, blocks_only):
+        """Move along one axis in sub-steps; returns what stopped the move, if anything."""
+        rect = player.rect
+        start = rect.topleft[axis]
+        steps = self.steps(distance)
+        free = 0
+        for step in range(1, steps + 1):
+            offset = round(distance * step / steps)
+            self.place(rect, axis, start + offset)
+            obstacle = self.hits(player, blocks_only)
+            if obstacle is None:
+                free = offset
+                continue
+
+            # Bisect for the first offset that overlaps
+            blocked = offset
+            while abs(blocked - free) > 1:
+                middle = (free + blocked) // 2
+                self.place(rect, axis, start + middle)
+                if self.hits(player, blocks_only) is None:
+                    free = middle
+                else:
+                    blocked = middle
+            self.place(rect, axis, start + (free if blocks_only else blocked))
+            return obstacle
+        return None
+
+    @staticmethod
+    def place(rect, axis, value):
+        if axis == 0:
+            rect.x = value
+        else:
+            rect.y = value
+
+    def sample(self, player, x, y, end_x, end_y):
+        """Record hazards and pickups along a tile-resolved path in player.swept."""
+        rect = player.rect
+        steps = self.steps(max(abs(end_x - x), abs(end_y - y)))
+        for step in range(1, steps):
+            rect.topleft = (x + round((end_x - x) * step / steps), y + round((end_y - y) * step / steps))
+            self.hits(player, blocks_only=True)
+        rect.topleft = (end_x, end_y)
+
+class LevelObjects(list):
+    """List of level objects that keeps a SpatialGrid and the baked terrain in sync.
+
+    Every other object is also kept in buckets by its class's CATEGORY, so
+    the per-tick loops only visit the kind of entity they update, and the
+    world can wake just the ones near the player.
+    """
+
+    def __init__(self, objects=(), cell_size=96, spawn=(100, 100)):
+        super().__init__()
+        self.grid = SpatialGrid(cell_size)
+        self.terrain = TerrainChunks()
+        self.tiles = TileMap(cell_size)
+        self.buckets = {category: [] for category in Category.BUCKETS}
+        self.spawn = spawn
+        # LevelStreamer that builds this level's chunks on demand, if any
+        self.streamer = None
+        self.extend(objects)
+
+    def append(self, obj, order=None):
+        """Add obj; an explicit order places it where it sits in the full level.
+
+        Streamed chunks arrive in whatever order the camera reaches them, so
+        they pass their level order to keep collision resolution identical
+        to a level built all at once.
+        """
+        self.grid.insert(obj, order)
+        if order is None:
+            super().append(obj)
+        else:
+            self.insert_in_order(self, obj)
+        if obj.CATEGORY == Category.TERRAIN:
+            self.terrain.add(obj)
+            self.tiles.add(obj)
+        elif order is None:
+            self.buckets[obj.CATEGORY].append(obj)
+        else:
+            self.insert_in_order(self.buckets[obj.CATEGORY], obj)
+
+    def insert_in_order(self, items, obj):
+        order = self.grid.order
+        key = order(obj)
+        index = len(items)
+        while index and order(items[index - 1]) > key:
+            index -= 1
+        list.insert(items, index, obj)
+
+    def extend(self, objects):
+        for obj in objects:
+            self.append(obj)
+
+    def remove(self, obj):
+        super().remove(obj)
+        self.grid.remove(obj)
+        if obj.CATEGORY == Category.TERRAIN:
+            self.terrain.remove(obj)
+            self.tiles.remove(obj)
+        else:
+            self.buckets[obj.CATEGORY].remove(obj)
+
+    def __contains__(self, obj):
+        return obj in self.grid.entries
+
+    def wake(self, tick, left, right):
+        """Simulated entities overlapping [left, right] horizontally, caught up to tick.
+
+        Returns the awake entities of each Category.SIMULATED bucket.
+        Entities outside the range sleep; the first time one is back in
+        range it fast-forwards over the ticks it missed before being returned.
+        """
+        awake = {}
+        for category in Category.SIMULATED:
+            active = awake[category] = []
+            for obj in self.buckets[category]:
+                if obj.rect.right >= left and obj.rect.left <= right:
+                    missed = tick - 1 - obj.last_tick
+                    if missed > 0:
+                        obj.fast_forward(missed)
+                        self.grid.move(obj)
+                        obj.remember_position()
+                    obj.last_tick = tick
+                    active.append(obj)
+        return awake
+
+    def draw(self, win, offset_x, alpha=1.0):
+        """Draw the baked terrain plus the dynamic objects inside the viewport."""
+        self.terrain.draw(win, offset_x)
+        viewport = pygame.Rect(math.floor(offset_x), 0, win.get_width() + 1, win.get_height())
+        for obj in self.grid.query(viewport):
+            if not isinstance(obj, Block):
+                obj.draw(win, offset_x, alpha)
+
+def nearby(objects, sprite):
+    """Candidate objects that may overlap sprite, in level order."""
+    if USE_SPATIAL_GRID and isinstance(objects, LevelObjects):
+        return objects.grid.scan(sprite)
+    return objects
+
+def track_move(objects, obj):
+    """Tell the level's grid that obj's rect changed."""
+    if isinstance(objects, LevelObjects):
+        objects.grid.move(obj)
+
+LEVELS_DIR = "levels"
+LEVEL_CACHE_DIR = join(LEVELS_DIR, ".cache")
+
+class LevelFormatError(ValueError):
+    """A level file is missing, malformed or fails validation."""
+
+class LevelData:
+    """A compiled level: a tile grid and an entity table, both backed by arrays.
+
+    Source files are JSON (see levels/level1.json). Tile rows are listed top
+    to bottom and the last row rests on the bottom of the screen. Entities
+    are given in pixels. The compiled form is cached as a flat binary file
+    next to the sources and reused while the source is unchanged.
+    """
+    MAGIC = b"PLVL"
+    VERSION = 1
+    # magic, version, source mtime_ns, source size, block size, origin column,
+    # columns, rows, spawn x, spawn y, entity count
+    HEADER = struct.Struct("<4sHqqiiiiiii")
+    TILE_CHARS = {".": 0, "#": 1}
+    TILE_BLOCK = 1
+    ENTITY_TYPES = ["fruit", "health_potion", "checkpoint", "level_exit", "enemy", "fire"]
+    VARIANTS = {
+        "fruit": ["apple", "banana", "orange", "grape"],
+        "enemy": ["walker", "shooter", "jumper"],
+    }
+    SIZED_TYPES = {"enemy", "fire"}
+    # type, variant, x, y, width, height, flags
+    ENTITY_FIELDS = 7
+    FLAG_ON = 1
+
+    def __init__(self, block_size, origin_column, columns, rows, spawn, tiles, entities):
+        self.block_size = block_size
+        self.origin_column = origin_column
+        self.columns = columns
+        self.rows = rows
+        self.spawn = spawn
+        self.tiles = tiles
+        self.entities = entities
+
+    @classmethod
+    def from_json(cls, doc, source="level"):
+        def fail(message):
+            raise LevelFormatError(f"{source}: {message}")
+
+        def integer(value, what):
+            if not isinstance(value, int) or isinstance(value, bool):
+                fail(f"{what} must be an integer, got {value!r}")
+            return value
+
+        if not isinstance(doc, dict):
+            fail("top level must be an object")
+        block_size = integer(doc.get("block_size", 96), "block_size")
+        if block_size <= 0:
+            fail("block_size must be positive")
+        origin_column = integer(doc.get("origin_column", 0), "origin_column")
+        spawn = doc.get("spawn", [100, 100])
+        if not isinstance(spawn, list) or len(spawn) != 2:
+            fail("spawn must be [x, y]")
+        spawn = (integer(spawn[0], "spawn x"), integer(spawn[1], "spawn y"))
+
+        rows = doc.get("tiles")
+        if not isinstance(rows, list) or not rows or not all(isinstance(row, str) for row in rows):
+            fail("tiles must be a non-empty list of strings")
+        columns = len(rows[0])
+        tiles = array("B")
+        for r, row in enumerate(rows):
+            if len(row) != columns:
+                fail(f"tile row {r} has {len(row)} columns, expected {columns}")
+            for c, char in enumerate(row):
+                if char not in cls.TILE_CHARS:
+                    fail(f"unknown tile {char!r} at row {r}, column {c}")
+                tiles.append(cls.TILE_CHARS[char])
+
+        entities = array("i")
+        exits = 0
+        for i, entity in enumerate(doc.get("entities", [])):
+            where = f"entity {i}"
+            if not isinstance(entity, dict):
+                fail(f"{where} must be an object")
+            kind = entity.get("type")
+            if kind not in cls.ENTITY_TYPES:
+                fail(f"{where} has unknown type {kind!r}")
+            variant = 0
+            if kind in cls.VARIANTS:
+                name = entity.get("variant", cls.VARIANTS[kind][0])
+                if name not in cls.VARIANTS[kind]:
+                    fail(f"{where} has unknown {kind} variant {name!r}")
+                variant = cls.VARIANTS[kind].index(name)
+            width = height = 0
+            if kind in cls.SIZED_TYPES:
+                width = integer(entity.get("width"), f"{where} width")
+                height = integer(entity.get("height"), f"{where} height")
+                if width <= 0 or height <= 0:
+                    fail(f"{where} must have a positive size")
+            flags = cls.FLAG_ON if entity.get("on") else 0
+            exits += kind == "level_exit"
+            entities.extend([cls.ENTITY_TYPES.index(kind), variant,
+                             integer(entity.get("x"), f"{where} x"), integer(entity.get("y"), f"{where} y"),
+                             width, height, flags])
+        if not exits:
+            fail("level has no level_exit")
+
+        return cls(block_size, origin_column, columns, len(rows), spawn, tiles, entities)
+
+    def to_bytes(self, source_mtime, source_size):
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, source_mtime, source_size,
+                                  self.block_size, self.origin_column, self.columns, self.rows,
+                                  self.spawn[0], self.spawn[1], len(self.entities) // self.ENTITY_FIELDS)
+        return header + self.tiles.tobytes() + self.entities.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, source_mtime, source_size):
+        """Decode a cached level, or return None if it is stale or corrupt."""
+        if len(data) < cls.HEADER.size:
+            return None
+        (magic, version, mtime, size, block_size, origin_column, columns, rows,
+         spawn_x, spawn_y, entity_count) = cls.HEADER.unpack_from(data)
+        if (magic, version, mtime, size) != (cls.MAGIC, cls.VERSION, source_mtime, source_size):
+            return None
+
+        tiles_end = cls.HEADER.size + columns * rows
+        entities = array("i")
+        if len(data) != tiles_end + entity_count * cls.ENTITY_FIELDS * entities.itemsize:
+            return None
+        tiles = array("B", data[cls.HEADER.size:tiles_end])
+        entities.frombytes(data[tiles_end:])
+        return cls(block_size, origin_column, columns, rows, (spawn_x, spawn_y), tiles, entities)
+
+    def block_positions(self, first_column=None, last_column=None):
+        """Top-left pixel position of every solid tile, bottom row first.
+
+        Walls come out bottom-up, the order the levels were authored in;
+        vertical collision snaps the player block by block in that order.
+        first_column and last_column (inclusive, in level columns where
+        origin_column is the leftmost) limit the result to a vertical strip.
+        """
+        size = self.block_size
+        start = 0 if first_column is None else max(0, first_column - self.origin_column)
+        stop = self.columns if last_column is None else min(self.columns, last_column - self.origin_column + 1)
+        for r in reversed(range(self.rows)):
+            y = HEIGHT - size * (self.rows - r)
+            row = r * self.columns
+            for c in range(start, stop):
+                if self.tiles[row + c] == self.TILE_BLOCK:
+                    yield (self.origin_column + c) * size, y
+
+    def block_order(self, x, y):
+        """Sort key of the block at pixel (x, y) that follows block_positions() order."""
+        size = self.block_size
+        row = self.rows - (HEIGHT - y) // size
+        return (self.rows - 1 - row) * self.columns + x // size - self.origin_column
+
+    def entity_order(self, index):
+        """Sort key of an entity, after every block."""
+        return self.rows * self.columns + index
+
+    def entity_count(self):
+        return len(self.entities) // self.ENTITY_FIELDS
+
+    def entity_record(self, index):
+        """(type, variant, x, y, width, height, flags) with type and variant as names."""
+        i = index * self.ENTITY_FIELDS
+        entities = self.entities
+        kind = self.ENTITY_TYPES[entities[i]]
+        variant = self.VARIANTS[kind][entities[i + 1]] if kind in self.VARIANTS else None
+        return (kind, variant, *entities[i + 2:i + self.ENTITY_FIELDS])
+
+    def entity_records(self):
+        for index in range(self.entity_count()):
+            yield self.entity_record(index)
+
+def level_path(level_num):
+    return join(LEVELS_DIR, f"level{level_num}.json")
+
+def level_count():
+    """Number of consecutive levelN.json files, starting at level 1."""
+    count = 0
+    while os.path.exists(level_path(count + 1)):
+        count += 1
+    return count
+
+LEVEL_COUNT = level_count()
+
+# LevelData by level number; levels are read from disk only the first time
+LOADED_LEVELS = {}
+
+def load_level(level_num):
+    level = LOADED_LEVELS.get(level_num)
+    if level is None:
+        level = LOADED_LEVELS[level_num] = read_level(level_num)
+    return level
+
+def read_level(level_num):
+    """Compile a level file, reusing its binary cache while the source is unchanged."""
+    path = level_path(level_num)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise LevelFormatError(f"{path}: level file not found")
+
+    cache_path = join(LEVEL_CACHE_DIR, f"level{level_num}.bin")
+    try:
+        with open(cache_path, "rb") as f:
+            level = LevelData.from_bytes(f.read(), stat.st_mtime_ns, stat.st_size)
+        if level is not None:
+            return level
+    except OSError:
+        pass
+
+    with open(path) as f:
+        try:
+            doc = json.load(f)
+        except ValueError as e:
+            raise LevelFormatError(f"{path}: {e}")
+    level = LevelData.from_json(doc, path)
+
+    try:
+        os.makedirs(LEVEL_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "wb") as f:
+            f.write(level.to_bytes(stat.st_mtime_ns, stat.st_size))
+    except OSError:
+        pass  # A read-only install just recompiles next time
+    return level
+
+def create_entity(kind, variant, x, y, width, height, flags):
+    if kind == "fruit":
+        return Fruit(x, y, variant)
+    elif kind == "health_potion":
+        return HealthPotion(x, y)
+    elif kind == "checkpoint":
+        return Checkpoint(x, y)
+    elif kind == "level_exit":
+        return LevelExit(x, y)
+    elif kind == "enemy":
+        return Enemy(x, y, width, height, variant)
+    elif kind == "fire":
+        fire = Fire(x, y, width, height)
+        if flags & LevelData.FLAG_ON:
+            fire.on()
+        return fire
+
+class LevelStreamer:
+    """Builds a level's objects one horizontal chunk at a time.
+
+    Chunks are built as the camera (or the player) comes within LOAD_MARGIN
+    chunks of them and evicted once both are more than EVICT_MARGIN chunks
+    away. Evicted entities keep their state and the tick they were last
+    simulated up to, so they fast-forward like any sleeping actor once
+    rebuilt, and collected ones stay gone.
+    """
+    CHUNK_COLUMNS = 10
+    LOAD_MARGIN = 1
+    EVICT_MARGIN = 2
+
+    def __init__(self, level, objects):
+        self.level = level
+        self.objects = objects
+        self.chunk_width = self.CHUNK_COLUMNS * level.block_size
+        self.entities_by_chunk = {}
+        for index in range(level.entity_count()):
+            x = level.entity_record(index)[2]
+            self.entities_by_chunk.setdefault(x // self.chunk_width, []).append(index)
+        self.loaded = {}   # chunk -> [(entity index or None for blocks, level order, object)]
+        self.saved = {}    # entity index -> (save_state(), last_tick) of an evicted entity
+        self.removed = set()
+
+    def chunks_near(self, left, right, margin):
+        return range(math.floor(left / self.chunk_width) - margin,
+                     math.floor(right / self.chunk_width) + margin + 1)
+
+    def update(self, offset_x, player_x):
+        wanted = set(self.chunks_near(offset_x, offset_x + WIDTH, self.LOAD_MARGIN))
+        wanted.update(self.chunks_near(player_x, player_x, self.LOAD_MARGIN))
+        for chunk in wanted:
+            if chunk not in self.loaded:
+                self.load(chunk)
+
+        keep = set(self.chunks_near(offset_x, offset_x + WIDTH, self.EVICT_MARGIN))
+        keep.update(self.chunks_near(player_x, player_x, self.EVICT_MARGIN))
+        for chunk in list(self.loaded):
+            if chunk not in keep:
+                self.evict(chunk)
+
+    def load(self, chunk):
+        level = self.level
+        built = []
+        first_column = chunk * self.CHUNK_COLUMNS
+        for x, y in level.block_positions(first_column, first_column + self.CHUNK_COLUMNS - 1):
+            built.append((None, level.block_order(x, y), Block(x, y, level.block_size)))
+        for index in self.entities_by_chunk.get(chunk, ()):
+            if index in self.removed:
+                continue
+            obj = create_entity(*level.entity_record(index))
+            if index in self.saved:
+                state, obj.last_tick = self.saved.pop(index)
+                obj.restore_state(state)
+                obj.remember_position()
+            built.append((index, level.entity_order(index), obj))
+
+        self.loaded[chunk] = built
+        for _, order, obj in built:
+            self.objects.append(obj, order)
+
+    def evict(self, chunk):
+        for index, _, obj in self.loaded.pop(chunk):
+            if obj in self.objects:
+                self.objects.remove(obj)
+                if index is not None:
+                    self.saved[index] = obj.save_state(), obj.last_tick
+            elif index is not None:
+                # Collected or destroyed while loaded
+                self.removed.add(index)
+
+def build_level(level, streaming=True):
+    """Objects for a LevelData, either streamed around the spawn or all at once."""
+    objects = LevelObjects(cell_size=level.block_size, spawn=level.spawn)
+    if streaming:
+        objects.streamer = LevelStreamer(level, objects)
+        objects.streamer.update(0, level.spawn[0])
+    else:
+        objects.extend(Block(x, y, level.block_size) for x, y in level.block_positions())
+        objects.extend(create_entity(*record) for record in level.entity_records())
+    return objects
 
-def draw(window, background, bg_image, player, objects, projectiles, offset_x, game_state):
-    # Clear screen
-    window.fill((50, 50, 100))  # Dark blue fallback
+def create_level(level_num, streaming=True):
+    projectiles = ProjectileStore()
     
+    return build_level(load_level(level_num), streaming), projectiles
+
+def draw(window, background, player, objects, projectiles, offset_x, game_state,
+         debug_overlay=None, fps=0, alpha=1.0):
+    """Render the world; alpha is how far the frame is from the previous tick to the current one."""
+    debugging = debug_overlay is not None and debug_overlay.visible
+    # Overlay screens sit on a frozen world, so only redraw when their text changes
+    overlay_key = game_state.overlay_key()
+    if overlay_key is not None and overlay_key == game_state.presented_overlay and not debugging:
+        return
+
     # Draw background
-    for tile in background:
-        window.blit(bg_image, (tile[0] - offset_x % bg_image.get_width(), tile[1]))
+    background.draw(window, offset_x)
 
     # Draw objects
-    for obj in objects:
-        obj.draw(window, offset_x)
+    if isinstance(objects, LevelObjects):
+        objects.draw(window, offset_x, alpha)
+    else:
+        for obj in objects:
+            obj.draw(window, offset_x, alpha)
     
     # Draw projectiles
-    for projectile in projectiles:
-        projectile.draw(window, offset_x)
+    if isinstance(projectiles, ProjectileStore):
+        for projectile in projectiles.visible(offset_x):
+            # Back along this tick's flight to where it is at alpha
+            projectile.draw(window, offset_x + round(projectile.speed * projectile.direction * (1 - alpha)))
+    else:
+        for projectile in projectiles:
+            if -projectile.rect.width < projectile.rect.x - offset_x < WIDTH:
+                projectile.draw(window, offset_x)
 
     # Draw player
     if game_state.state == GameState.PLAYING:
-        player.draw(window, offset_x)
+        player.draw(window, offset_x, alpha)
     
     # Draw UI
-    game_state.draw_ui(window)
+    dirty = game_state.draw_ui(window)
 
-    pygame.display.update()
+    if debugging:
+        debug_overlay.draw(window, fps)
+
+    previous = game_state.presented_overlay
+    if overlay_key is not None and previous is not None and previous[0] == overlay_key[0] and not debugging:
+        # Same screen with new values: only push the text that changed
+        pygame.display.update(game_state.overlay_rects + dirty)
+    else:
+        pygame.display.update()
+    game_state.presented_overlay = overlay_key
+    game_state.overlay_rects = dirty
 
 def handle_vertical_collision(player, objects, dy):
     collided_objects = []
-    for obj in objects:
-        if pygame.sprite.collide_mask(player, obj):
+    for obj in nearby(objects, player):
+        if collide_mask(player, obj):
             if dy > 0:
                 player.rect.bottom = obj.rect.top
                 player.landed()
@@ -817,12 +2648,13 @@ def handle_vertical_collision(player, objects, dy):
 
     return collided_objects
 
-def collide(player, objects, dx):
+def collide(player, objects, dx, category=None):
+    """First object the player would overlap dx pixels over; with category, only of that Category."""
     player.move(dx, 0)
     player.update()
     collided_object = None
-    for obj in objects:
-        if pygame.sprite.collide_mask(player, obj):
+    for obj in nearby(objects, player):
+        if (category is None or obj.CATEGORY == category) and collide_mask(player, obj):
             collided_object = obj
             break
 
@@ -830,10 +2662,19 @@ def collide(player, objects, dx):
     player.update()
     return collided_object
 
-def check_wall_slide(player, objects):
+def touching(player, objects):
+    """Non-terrain objects whose masks overlap the player's, for tile collision mode."""
+    return [obj for obj in nearby(objects, player)
+            if not isinstance(obj, Block) and collide_mask(player, obj)]
+
+def check_wall_slide(player, objects, tiles=None):
     # Check for wall sliding
-    wall_left = collide(player, objects, -5)
-    wall_right = collide(player, objects, 5)
+    if tiles is None:
+        wall_left = collide(player, objects, -5)
+        wall_right = collide(player, objects, 5)
+    else:
+        wall_left = tiles.blocked(player.hitbox(), -5)
+        wall_right = tiles.blocked(player.hitbox(), 5)
     
     if (wall_left or wall_right) and player.y_vel > 0 and player.jump_count > 0:
         player.wall_slide = True
@@ -844,104 +2685,594 @@ def check_wall_slide(player, objects):
     else:
         player.wall_slide = False
 
-def handle_move(player, objects, projectiles, game_state):
+class GameEvents:
+    """Gameplay events raised during a tick, applied together by process().
+
+    Entities raise them from Object.touch() and handle_move() raises them
+    for projectile hits, so deciding what touching something means stays
+    with its class. Each event is a (kind, source, amount) tuple.
+    """
+    DAMAGE = "damage"          # source hurt the player by amount; None for falling
+    CONTACT = "contact"        # source touched the player; DAMAGE, or once per hit if contact_once
+    PICKUP = "pickup"          # source was collected
+    CHECKPOINT = "checkpoint"  # source was reached
+    EXIT = "exit"              # the level is complete
+
+    def __init__(self):
+        self.queue = []
+        self.handlers = {self.DAMAGE: self.damage, self.CONTACT: self.contact,
+                         self.PICKUP: self.pickup, self.CHECKPOINT: self.checkpoint,
+                         self.EXIT: self.exit}
+        # Set by handle_move under tile collision, where nothing pushes the
+        # player back out of a hazard and an overlap lasts many ticks
+        self.contact_once = False
+
+    def push(self, kind, source=None, amount=0):
+        self.queue.append((kind, source, amount))
+
+    def process(self, player, objects, game_state):
+        """Apply and clear every queued event, in the order they were raised."""
+        for kind, source, amount in self.queue:
+            self.handlers[kind](player, objects, game_state, source, amount)
+        self.queue.clear()
+
+    @staticmethod
+    def damage(player, objects, game_state, source, amount):
+        if source is not None:
+            player.make_hit()
+        game_state.take_damage(amount)
+
+    def contact(self, player, objects, game_state, source, amount):
+        if not (self.contact_once and player.hit):
+            self.damage(player, objects, game_state, source, amount)
+
+    @staticmethod
+    def pickup(player, objects, game_state, source, amount):
+        AUDIO.play("collect")
+        source.collect(game_state)
+        if source in objects:
+            objects.remove(source)
+
+    @staticmethod
+    def checkpoint(player, objects, game_state, source, amount):
+        if not source.activated:
+            source.activate()
+            game_state.checkpoint_reached = True
+            game_state.checkpoint_pos = (player.rect.x, player.rect.y)
+            AUDIO.play("checkpoint")
+
+    @staticmethod
+    def exit(player, objects, game_state, source, amount):
+        game_state.state = GameState.LEVEL_COMPLETE
+        AUDIO.play("level_complete")
+
+def handle_move(player, objects, projectiles, game_state, keys=None, tiles=None, substep=False,
+                events=None):
+    """Apply input and resolve what the player touches this tick.
+
+    With tiles (a TileMap), terrain has already been resolved by the swept
+    move in Player.loop, and only hazards and pickups are tested here.
+    With substep, objects passed through during a sub-stepped move count
+    as touched, and projectiles are tested along their whole path.
+    What is touched is queued on events, for the caller to process once
+    the tick is over; without events it is processed before returning.
+    """
     if game_state.state != GameState.PLAYING:
         return
 
-    keys = pygame.key.get_pressed()
+    if keys is None:
+        keys = pygame.key.get_pressed()
 
     # Apply friction when no keys are pressed
     if not (keys[pygame.K_LEFT] or keys[pygame.K_RIGHT]):
         player.apply_friction()
 
-    collide_left = collide(player, objects, -PLAYER_VEL * 2)
-    collide_right = collide(player, objects, PLAYER_VEL * 2)
-
-    if keys[pygame.K_LEFT] and not collide_left:
-        player.move_left(PLAYER_VEL)
-    if keys[pygame.K_RIGHT] and not collide_right:
-        player.move_right(PLAYER_VEL)
-
-    # Check for wall sliding
-    check_wall_slide(player, objects)
-
-    vertical_collide = handle_vertical_collision(player, objects, player.y_vel)
-    to_check = [collide_left, collide_right, *vertical_collide]
-
-    # Check for collisions and handle different object types
-    objects_to_remove = []
+    if tiles is not None:
+        # The TileMap stops the player at terrain; enemies still block like the mask probes
+        collide_left = collide(player, objects, -PLAYER_VEL * 2, Category.ENEMIES)
+        collide_right = collide(player, objects, PLAYER_VEL * 2, Category.ENEMIES)
+
+        if keys[pygame.K_LEFT] and not collide_left:
+            player.move_left(PLAYER_VEL)
+        if keys[pygame.K_RIGHT] and not collide_right:
+            player.move_right(PLAYER_VEL)
+        check_wall_slide(player, objects, tiles)
+        to_check = [collide_left, collide_right]
+        to_check += [obj for obj in touching(player, objects) if obj not in to_check]
+    else:
+        collide_left = collide(player, objects, -PLAYER_VEL * 2)
+        collide_right = collide(player, objects, PLAYER_VEL * 2)
+
+        if keys[pygame.K_LEFT] and not collide_left:
+            player.move_left(PLAYER_VEL)
+        if keys[pygame.K_RIGHT] and not collide_right:
+            player.move_right(PLAYER_VEL)
+
+        # Check for wall sliding
+        check_wall_slide(player, objects)
+
+        vertical_collide = handle_vertical_collision(player, objects, player.y_vel)
+        to_check = [collide_left, collide_right, *vertical_collide]
+    if player.swept:
+        to_check += [obj for obj in player.swept if obj not in to_check]
+
+    processed_here = events is None
+    if processed_here:
+        events = GameEvents()
+    events.contact_once = tiles is not None
     for obj in to_check:
-        if obj and obj.name:
-            if obj.name == "fire" or obj.name.startswith("enemy"):
-                player.make_hit()
-                game_state.take_damage(25)
-            elif obj.name == "fruit":
-                if collect_sound:
-                    collect_sound.play()
-                game_state.fruits_collected += 1
-                game_state.score += obj.points
-                objects_to_remove.append(obj)
-            elif obj.name == "health_potion":
-                if collect_sound:
-                    collect_sound.play()
-                game_state.heal(obj.heal_amount)
-                game_state.score += 50
-                objects_to_remove.append(obj)
-            elif obj.name == "checkpoint":
-                if not obj.activated:
-                    obj.activated = True
-                    game_state.checkpoint_reached = True
-                    game_state.checkpoint_pos = (player.rect.x, player.rect.y)
-                    if checkpoint_sound:
-                        checkpoint_sound.play()
-                    # Change checkpoint appearance
-                    obj.image.fill((0, 0, 0, 0))
-                    pygame.draw.rect(obj.image, (139, 69, 19), (4, 0, 4, 64))
-                    pygame.draw.rect(obj.image, (0, 255, 0), (8, 8, 20, 12))  # Green flag
-            elif obj.name == "level_exit":
-                game_state.state = GameState.LEVEL_COMPLETE
-                if level_complete_sound:
-                    level_complete_sound.play()
+        if obj:
+            obj.touch(events)
     
     # Check projectile collisions
-    for projectile in projectiles[:]:
-        if pygame.sprite.collide_mask(player, projectile):
-            player.make_hit()
-            game_state.take_damage(15)
-            projectiles.remove(projectile)
-    
-    # Remove collected items
-    for obj in objects_to_remove:
-        if obj in objects:
-            objects.remove(obj)
-
-def update_enemies_and_projectiles(objects, projectiles, player_pos):
-    # Update enemies
-    for obj in objects:
-        if obj.name and obj.name.startswith("enemy"):
-            obj.update(player_pos, projectiles)
-    
-    # Update projectiles
-    for projectile in projectiles[:]:
-        projectile.update()
-        # Remove projectiles that are off screen
-        if projectile.rect.x < -50 or projectile.rect.x > WIDTH + 50:
-            projectiles.remove(projectile)
-
-def main(window):
-    clock = pygame.time.Clock()
-    background, bg_image = get_background("Pink.png")
+    if isinstance(projectiles, ProjectileStore):
+        hits = projectiles.collide(player, substep and projectiles.fast())
+    else:
+        hits = [projectile for projectile in projectiles
+                if (projectile.sweep_hit(player) if substep else collide_mask(player, projectile))]
+        projectiles[:] = [projectile for projectile in projectiles if projectile not in hits]
+    for projectile in hits:
+        events.push(GameEvents.DAMAGE, projectile, Projectile.DAMAGE)
+
+    if processed_here:
+        events.process(player, objects, game_state)
+
+def update_enemies_and_projectiles(objects, projectiles, player_pos, enemies=None):
+    # Update enemies (only the awake ones, when the caller tracks activity)
+    if enemies is None:
+        enemies = [obj for obj in objects if obj.CATEGORY == Category.ENEMIES]
+    for obj in enemies:
+        obj.update(player_pos, projectiles)
+        track_move(objects, obj)
     
-    game_state = GameState()
-    player = Player(100, 100, 50, 50)
-    objects, projectiles = create_level(1)
-
-    offset_x = 0
+    # Update projectiles, removing the ones that are off screen
+    if isinstance(projectiles, ProjectileStore):
+        projectiles.update()
+    else:
+        for projectile in projectiles:
+            projectile.update()
+        projectiles[:] = [p for p in projectiles if -50 <= p.rect.x <= WIDTH + 50]
+
+class FrameTimer:
+    """Collects how long each stage of the main loop body takes, in seconds.
+
+    Between begin_frame() and end_frame() it also gathers COUNTERS, and
+    end_frame() hands a report of the frame to every subscribed hook:
+    {"frame_ms": float, "stages": {stage: ms}, "counters": {name: int}}.
+    """
+
+    def __init__(self, keep_samples=True, history=240):
+        self.samples = {} if keep_samples else None
+        self.stages = {}
+        self.history = deque(maxlen=history)
+        self.hooks = []
+        self.report = None
+        self.frame_start = self.last = time.perf_counter()
+
+    def subscribe(self, hook):
+        self.hooks.append(hook)
+
+    def unsubscribe(self, hook):
+        self.hooks.remove(hook)
+
+    def begin_frame(self):
+        for name in COUNTERS:
+            COUNTERS[name] = 0
+        self.stages = {}
+        self.frame_start = self.last = time.perf_counter()
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        """Attribute the time since the previous mark (or start) to stage."""
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.stages[stage] = self.stages.get(stage, 0) + elapsed
+        if self.samples is not None:
+            self.samples.setdefault(stage, []).append(elapsed)
+        self.last = now
+
+    def end_frame(self, **counts):
+        """Finish the frame, adding counts such as objects=len(objects) to the report."""
+        frame_ms = (time.perf_counter() - self.frame_start) * 1000
+        counters = dict(COUNTERS)
+        counters.update(counts)
+        self.report = {
+            "frame_ms": frame_ms,
+            "stages": {stage: elapsed * 1000 for stage, elapsed in self.stages.items()},
+            "counters": counters,
+        }
+        self.history.append(frame_ms)
+        for hook in self.hooks:
+            hook(self.report)
+        return self.report
+
+class DebugOverlay:
+    """Toggleable panel with FPS, a frame-time graph and the last FrameTimer report."""
+    GRAPH_HEIGHT = 60
+
+    def __init__(self, timer, startup=None, fps=FPS):
+        self.timer = timer
+        # Frame time at the frame rate cap
+        self.budget_ms = 1000 / fps
+        # Time-to-first-frame and asset load time in ms since STARTED, if measured
+        self.startup = startup or {}
+        self.visible = False
+        self.font = pygame.font.Font(None, 22)
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def draw(self, window, fps):
+        report = self.timer.report
+        if not self.visible or report is None:
+            return
+
+        lines = [f"FPS: {fps:.1f}   frame: {report['frame_ms']:.2f} ms"]
+        if self.startup:
+            lines.append("   ".join(f"{name}: {ms:.0f}" for name, ms in self.startup.items()))
+        lines += [f"{stage}: {ms:.2f} ms" for stage, ms in report["stages"].items()]
+        lines += [f"{name}: {count}" for name, count in report["counters"].items()]
+
+        graph_width = self.timer.history.maxlen
+        line_height = 18
+        panel = pygame.Rect(10, 0, max(graph_width, 260) + 20,
+                            len(lines) * line_height + self.GRAPH_HEIGHT + 30)
+        panel.bottom = HEIGHT - 10
+        background = pygame.Surface(panel.size, pygame.SRCALPHA)
+        background.fill((0, 0, 0, 170))
+        window.blit(background, panel)
+
+        y = panel.y + 10
+        for line in lines:
+            window.blit(self.font.render(line, True, (255, 255, 255)), (panel.x + 10, y))
+            y += line_height
+
+        # Frame-time graph, scaled so the frame budget sits halfway up
+        graph_bottom = panel.bottom - 10
+        scale = self.GRAPH_HEIGHT / (self.budget_ms * 2)
+        for i, frame_ms in enumerate(self.timer.history):
+            bar = min(self.GRAPH_HEIGHT, frame_ms * scale)
+            color = (255, 80, 80) if frame_ms > self.budget_ms else (80, 255, 80)
+            pygame.draw.line(window, color, (panel.x + 10 + i, graph_bottom),
+                             (panel.x + 10 + i, graph_bottom - bar))
+        budget_y = graph_bottom - self.budget_ms * scale
+        pygame.draw.line(window, (255, 255, 0), (panel.x + 10, budget_y),
+                         (panel.x + 10 + graph_width, budget_y))
+
+class KeyState(dict):
+    """Held keys indexable like pygame.key.get_pressed(); missing keys read as up."""
+
+    def __missing__(self, key):
+        return False
+
+class World:
+    """Everything the simulation advances each tick, independent of any window.
+
+    main() drives it from real events and pygame.key.get_pressed(); headless
+    callers drive it with tick() and a scripted input vector.
+    """
     scroll_area_width = 200
+    # Actors further than this from both the player and the camera view
+    # sleep; None simulates every actor every tick
+    active_radius = 600
+    # "mask": terrain collision by per-pixel probes, as the game always did.
+    # "tiles": Blocks form a TileMap with swept AABB movement, and masks are
+    # only used for hazards and pickups.
+    collision = "mask"
+    # Sub-step fast moves (see SubstepMover) and sweep projectile paths
+    substep = False
 
+    def __init__(self):
+        self.game_state = GameState()
+        self.objects, self.projectiles = create_level(1)
+        self.player = Player(*self.objects.spawn, 50, 50)
+        self.offset_x = 0
+        # Camera offset after the previous tick, for drawing between ticks
+        self.prev_offset_x = 0
+        self.ticks = 0
+        # Entities each bucket woke for the last tick, by Category
+        self.awake = {}
+        # Gameplay events raised during step(), processed at its end
+        self.events = GameEvents()
+        # Optional FrameTimer that step() reports its stages to
+        self.timer = None
+
+    def start_level(self, level_num):
+        self.game_state.state = GameState.PLAYING
+        self.game_state.current_level = level_num
+        self.objects, self.projectiles = create_level(level_num)
+        self.player = Player(*self.objects.spawn, 50, 50)
+        self.offset_x = self.prev_offset_x = 0
+        self.ticks = 0
+        self.awake = {}
+
+    def render_offset(self, alpha):
+        """Camera offset alpha of the way from the previous tick to the current one."""
+        return round(self.prev_offset_x + (self.offset_x - self.prev_offset_x) * alpha)
+
+    def active_range(self):
+        """Horizontal range of level x coordinates in which actors are simulated."""
+        if self.active_radius is None:
+            return -math.inf, math.inf
+        player_x = self.player.rect.centerx
+        return (min(self.offset_x, player_x) - self.active_radius,
+                max(self.offset_x + WIDTH, player_x) + self.active_radius)
+
+    def handle_key(self, key):
+        """Apply one KEYDOWN. Returns False when the player asked to quit."""
+        game_state = self.game_state
+        if game_state.state == GameState.MENU:
+            if key == pygame.K_RETURN:
+                self.start_level(1)
+            elif key == pygame.K_q:
+                return False
+        
+        elif game_state.state == GameState.PLAYING:
+            if key == pygame.K_SPACE:
+                self.player.jump()
+            elif key == pygame.K_x:
+                self.player.dash()
+            elif key == pygame.K_p:
+                game_state.state = GameState.PAUSED
+        
+        elif game_state.state == GameState.PAUSED:
+            if key == pygame.K_p:
+                game_state.state = GameState.PLAYING
+            elif key == pygame.K_m:
+                game_state.state = GameState.MENU
+        
+        elif game_state.state == GameState.GAME_OVER:
+            if key == pygame.K_r:
+                # Restart current level
+                self.game_state = GameState()
+                self.start_level(1)
+            elif key == pygame.K_m:
+                self.game_state = GameState()
+        
+        elif game_state.state == GameState.LEVEL_COMPLETE:
+            if key == pygame.K_n and game_state.current_level < game_state.max_level:
+                # Next level
+                game_state.checkpoint_reached = False
+                self.start_level(game_state.current_level + 1)
+            elif key == pygame.K_m:
+                self.game_state = GameState()
+        return True
+
+    def step(self, keys):
+        """Advance the simulation by one fixed tick with the given held keys."""
+        self.prev_offset_x = self.offset_x
+        self.player.prev_pos = self.player.rect.topleft
+        # Whatever this tick does not move is drawn where it is now
+        for active in self.awake.values():
+            for obj in active:
+                obj.remember_position()
+        game_state = self.game_state
+        if game_state.state != GameState.PLAYING:
+            return
+
+        player, objects, projectiles = self.player, self.objects, self.projectiles
+        timer = self.timer
+        if timer:
+            timer.start()
+        self.ticks += 1
+
+        # Build the chunks coming into view and drop the ones left far behind
+        if objects.streamer:
+            objects.streamer.update(self.offset_x, player.rect.centerx)
+            if timer:
+                timer.mark("streaming")
+
+        # Wake the entities near the player and camera; the rest sleep
+        awake = self.awake = objects.wake(self.ticks, *self.active_range())
+
+        # Update moving pickups
+        for obj in awake[Category.PICKUPS]:
+            obj.update()
+            track_move(objects, obj)
+        if timer:
+            timer.mark("objects")
+        
+        # Update enemies and projectiles
+        update_enemies_and_projectiles(objects, projectiles, (player.rect.centerx, player.rect.centery),
+                                       awake[Category.ENEMIES])
+        if timer:
+            timer.mark("enemies_projectiles")
+        
+        tiles = objects.tiles if self.collision == "tiles" else None
+        player.loop(FPS, SubstepMover(objects, tiles) if self.substep else tiles)
+        if timer:
+            timer.mark("player_loop")
+        
+        # Update fire animations
+        for obj in awake[Category.ANIMATED]:
+            obj.loop()
+            track_move(objects, obj)
+        if timer:
+            timer.mark("fire_loop")
+        
+        events = self.events
+        handle_move(player, objects, projectiles, game_state, keys, tiles, self.substep, events)
+        if timer:
+            timer.mark("handle_move")
+
+        # Check if player falls off the world
+        if player.rect.y > HEIGHT + 100:
+            if game_state.checkpoint_reached:
+                # Respawn at checkpoint
+                player.rect.x, player.rect.y = game_state.checkpoint_pos
+                events.push(GameEvents.DAMAGE, None, 25)
+            else:
+                # Respawn at start
+                player.rect.x, player.rect.y = objects.spawn
+                events.push(GameEvents.DAMAGE, None, 50)
+            
+            player.x_vel = player.y_vel = 0
+
+        # Camera scrolling
+        if ((player.rect.right - self.offset_x >= WIDTH - self.scroll_area_width) and player.x_vel > 0) or (
+                (player.rect.left - self.offset_x <= self.scroll_area_width) and player.x_vel < 0):
+            self.offset_x += player.x_vel
+
+        # Everything the player touched or suffered this tick takes effect together
+        events.process(player, objects, game_state)
+
+    def state_hash(self):
+        """CRC of the state a replay must reproduce exactly each tick."""
+        player, game_state = self.player, self.game_state
+        state = (tuple(player.rect), player.x_vel, player.y_vel, self.offset_x,
+                 game_state.state, game_state.score, game_state.health, game_state.lives,
+                 game_state.current_level, game_state.fruits_collected,
+                 game_state.checkpoint_reached, game_state.checkpoint_pos,
+                 len(self.objects), len(self.projectiles))
+        return zlib.crc32(repr(state).encode())
+
+    def tick(self, left=False, right=False, jump=False, dash=False):
+        """Advance one tick from a scripted input vector, as if keys were pressed."""
+        if jump:
+            self.handle_key(pygame.K_SPACE)
+        if dash:
+            self.handle_key(pygame.K_x)
+        self.step(KeyState({pygame.K_LEFT: left, pygame.K_RIGHT: right}))
+
+class SessionRecording:
+    """Compact binary log of one play session, one record per tick.
+
+    The header names the collision and sub-stepping modes the session ran
+    with, which a replay has to use too. Each tick stores a byte with the
+    held arrow keys (bits 0-1) and the number of KEYDOWN events (bits 2-7),
+    the events as indexes into KEYS, the real frame time in ms and the CRC
+    of the world state after the tick.
+    """
+    MAGIC = b"PLRP"
+    VERSION = 2
+    HEADER = struct.Struct("<4sHI")
+    # Since version 2: collision mode as an index into COLLISION_MODES, substep
+    MODES = struct.Struct("<BB")
+    COLLISION_MODES = ["mask", "tiles"]
+    TICK = struct.Struct("<HI")
+    # Every key World.handle_key() reacts to
+    KEYS = [pygame.K_RETURN, pygame.K_q, pygame.K_SPACE, pygame.K_x,
+            pygame.K_p, pygame.K_m, pygame.K_r, pygame.K_n]
+
+    def __init__(self, seed, collision=None, substep=None):
+        self.seed = seed
+        # World's current modes unless given
+        self.collision = World.collision if collision is None else collision
+        self.substep = World.substep if substep is None else substep
+        self.ticks = []  # (left, right, key events, frame ms, state hash)
+
+    def record(self, keys, key_events, frame_ms, state_hash):
+        events = [key for key in key_events if key in self.KEYS]
+        self.ticks.append((bool(keys[pygame.K_LEFT]), bool(keys[pygame.K_RIGHT]),
+                           events, frame_ms, state_hash))
+
+    def save(self, path):
+        data = bytearray(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed))
+        data.extend(self.MODES.pack(self.COLLISION_MODES.index(self.collision), self.substep))
+        for left, right, events, frame_ms, state_hash in self.ticks:
+            data.append(left | right << 1 | min(len(events), 63) << 2)
+            data.extend(self.KEYS.index(key) for key in events[:63])
+            data.extend(self.TICK.pack(min(frame_ms, 0xFFFF), state_hash))
+        with open(path, "wb") as f:
+            f.write(data)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, seed = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or not 1 <= version <= cls.VERSION:
+            raise ValueError(f"{path} is not a version 1-{cls.VERSION} session recording")
+
+        pos = cls.HEADER.size
+        if version >= 2:
+            collision, substep = cls.MODES.unpack_from(data, pos)
+            pos += cls.MODES.size
+            recording = cls(seed, cls.COLLISION_MODES[collision], bool(substep))
+        else:
+            # Older files don't say, so they replay with the modes World is set to
+            recording = cls(seed)
+        while pos < len(data):
+            flags = data[pos]
+            count = flags >> 2
+            events = [cls.KEYS[i] for i in data[pos + 1:pos + 1 + count]]
+            pos += 1 + count
+            frame_ms, state_hash = cls.TICK.unpack_from(data, pos)
+            pos += cls.TICK.size
+            recording.ticks.append((bool(flags & 1), bool(flags & 2), events, frame_ms, state_hash))
+        return recording
+
+def replay_session(recording):
+    """Re-run a recording headlessly as fast as possible.
+
+    The world runs with the recording's collision and sub-stepping modes.
+    Returns the index of the first tick whose state hash differs from the
+    recorded one, or None if the whole session reproduced exactly.
+    """
+    seed_rng(recording.seed)
+    world = World()
+    world.collision = recording.collision
+    world.substep = recording.substep
+    for i, (left, right, events, _, state_hash) in enumerate(recording.ticks):
+        for key in events:
+            world.handle_key(key)
+        world.step(KeyState({pygame.K_LEFT: left, pygame.K_RIGHT: right}))
+        if world.state_hash() != state_hash:
+            return i
+    return None
+
+def main(window, recording=None, fps=FPS, hooks=()):
+    """Run the game window, rendering up to fps frames per second.
+
+    The simulation advances in fixed ticks of TICK_MS whatever the frame
+    rate. Each frame runs the ticks real time has accumulated, at most
+    MAX_FRAME_TICKS so a long stall can't snowball, and draws moving
+    things interpolated between the last two ticks. Each of hooks is
+    subscribed to the loop's FrameTimer and gets every frame's report.
+    """
+    clock = pygame.time.Clock()
+    # Decode everything before play so level loads and restarts never touch
+    # disk, on background threads behind a loading screen
+    game_state = GameState()
+    game_state.state = GameState.LOADING
+    loader = AssetLoader()
+    AUDIO.queue_preload(loader)
+    ASSETS.queue_preload(loader)
+    startup = {}
+    while not loader.update():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+        game_state.loading_progress = loader.progress
+        window.fill((50, 50, 100))
+        game_state.draw_ui(window)
+        pygame.display.update()
+        startup.setdefault("first_frame_ms", (time.perf_counter() - STARTED) * 1000)
+        clock.tick(fps)
+    startup["loaded_ms"] = (time.perf_counter() - STARTED) * 1000
+    background = get_background("Pink.png")
+    
+    world = World()
+    world.game_state = game_state
+    game_state.state = GameState.MENU
+    # Per-stage timings for the F3 overlay and any external profiler
+    timer = FrameTimer(keep_samples=False)
+    for hook in hooks:
+        timer.subscribe(hook)
+    world.timer = timer
+    debug_overlay = DebugOverlay(timer, startup, fps)
+
+    # Real time not yet simulated, in ms
+    accumulator = 0.0
+    # Keys pressed since the last tick, recorded with the next one
+    key_events = []
     run = True
     while run:
-        clock.tick(FPS)
+        accumulator += clock.tick(fps)
+        timer.begin_frame()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -949,94 +3280,81 @@ def main(window):
                 break
 
             if event.type == pygame.KEYDOWN:
-                if game_state.state == GameState.MENU:
-                    if event.key == pygame.K_RETURN:
-                        game_state.state = GameState.PLAYING
-                        game_state.current_level = 1
-                        objects, projectiles = create_level(1)
-                        player = Player(100, 100, 50, 50)
-                        offset_x = 0
-                    elif event.key == pygame.K_q:
-                        run = False
-                
-                elif game_state.state == GameState.PLAYING:
-                    if event.key == pygame.K_SPACE:
-                        player.jump()
-                    elif event.key == pygame.K_x:
-                        player.dash()
-                    elif event.key == pygame.K_p:
-                        game_state.state = GameState.PAUSED
-                
-                elif game_state.state == GameState.PAUSED:
-                    if event.key == pygame.K_p:
-                        game_state.state = GameState.PLAYING
-                    elif event.key == pygame.K_m:
-                        game_state.state = GameState.MENU
-                
-                elif game_state.state == GameState.GAME_OVER:
-                    if event.key == pygame.K_r:
-                        # Restart current level
-                        game_state = GameState()
-                        game_state.state = GameState.PLAYING
-                        game_state.current_level = 1
-                        player = Player(100, 100, 50, 50)
-                        objects, projectiles = create_level(1)
-                        offset_x = 0
-                    elif event.key == pygame.K_m:
-                        game_state = GameState()
-                
-                elif game_state.state == GameState.LEVEL_COMPLETE:
-                    if event.key == pygame.K_n and game_state.current_level < game_state.max_level:
-                        # Next level
-                        game_state.current_level += 1
-                        game_state.state = GameState.PLAYING
-                        game_state.checkpoint_reached = False
-                        player = Player(100, 100, 50, 50)
-                        objects, projectiles = create_level(game_state.current_level)
-                        offset_x = 0
-                    elif event.key == pygame.K_m:
-                        game_state = GameState()
-
-        if game_state.state == GameState.PLAYING:
-            # Update moving objects
-            for obj in objects:
-                if hasattr(obj, 'update') and obj.name and not obj.name.startswith("enemy"):
-                    obj.update()
-            
-            # Update enemies and projectiles
-            update_enemies_and_projectiles(objects, projectiles, (player.rect.centerx, player.rect.centery))
-            
-            player.loop(FPS)
-            
-            # Update fire animations
-            for obj in objects:
-                if obj.name and obj.name == "fire":
-                    obj.loop()
-            
-            handle_move(player, objects, projectiles, game_state)
-            
-            # Check if player falls off the world
-            if player.rect.y > HEIGHT + 100:
-                if game_state.checkpoint_reached:
-                    # Respawn at checkpoint
-                    player.rect.x, player.rect.y = game_state.checkpoint_pos
-                    game_state.take_damage(25)
-                else:
-                    # Respawn at start
-                    player.rect.x, player.rect.y = 100, 100
-                    game_state.take_damage(50)
-                
-                player.x_vel = player.y_vel = 0
-
-            # Camera scrolling
-            if ((player.rect.right - offset_x >= WIDTH - scroll_area_width) and player.x_vel > 0) or (
-                    (player.rect.left - offset_x <= scroll_area_width) and player.x_vel < 0):
-                offset_x += player.x_vel
-
-        draw(window, background, bg_image, player, objects, projectiles, offset_x, game_state)
+                if event.key == pygame.K_F3:
+                    debug_overlay.toggle()
+                    # Repaint a frozen overlay screen with or without the panel
+                    world.game_state.presented_overlay = None
+                    continue
+                key_events.append(event.key)
+                if not world.handle_key(event.key):
+                    run = False
+        timer.mark("events")
+
+        keys = pygame.key.get_pressed()
+        ticks = 0
+        while accumulator >= TICK_MS and ticks < MAX_FRAME_TICKS:
+            world.step(keys)
+            accumulator -= TICK_MS
+            ticks += 1
+            if recording is not None:
+                recording.record(keys, key_events, clock.get_time(), world.state_hash())
+            key_events = []
+        if ticks == MAX_FRAME_TICKS:
+            # Too far behind to catch up: let the rest of the stall pass
+            accumulator %= TICK_MS
+        AUDIO.flush()
+
+        timer.start()
+        alpha = accumulator / TICK_MS
+        draw(window, background, world.player, world.objects, world.projectiles,
+             world.render_offset(alpha), world.game_state, debug_overlay, clock.get_fps(), alpha)
+        startup.setdefault("first_frame_ms", (time.perf_counter() - STARTED) * 1000)
+        timer.mark("draw")
+        timer.end_frame(ticks=ticks, objects=len(world.objects), projectiles=len(world.projectiles),
+                        dropped_shots=world.projectiles.pool.stats["overflow"],
+                        dropped_sounds=AUDIO.stats["dropped"])
 
     pygame.quit()
-    quit()
 
 if __name__ == "__main__":
-    main(window)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Advanced Platformer Adventure")
+    parser.add_argument("--record", metavar="PATH", help="save this session's input for replay")
+    parser.add_argument("--replay", metavar="PATH", help="re-run a recorded session headlessly and verify it")
+    parser.add_argument("--seed", type=int, help="seed for gameplay randomness")
+    parser.add_argument("--collision", choices=["mask", "tiles"], default=World.collision,
+                        help="terrain collision mode (replays use the recording's mode)")
+    parser.add_argument("--substep", action="store_true",
+                        help="sub-step fast moves and projectile paths so nothing tunnels")
+    parser.add_argument("--fps", type=int, default=FPS,
+                        help=f"frame rate cap; the game always simulates {FPS} ticks per second")
+    parser.add_argument("--build-atlas", action="store_true",
+                        help="rebuild stale sprite atlas pages for every asset folder and exit")
+    args = parser.parse_args()
+    World.collision = args.collision
+    World.substep = args.substep
+
+    if args.build_atlas:
+        init_display()
+        rebuilt = ASSETS.atlas.build_all()
+        print(f"Rebuilt {len(rebuilt)} atlas pages in {ASSETS.atlas.cache_dir}")
+    elif args.replay:
+        recording = SessionRecording.load(args.replay)
+        print(f"Replaying with {recording.collision} collision"
+              + (" and sub-stepping" if recording.substep else ""))
+        mismatch = replay_session(recording)
+        slowest = sorted(range(len(recording.ticks)), key=lambda i: recording.ticks[i][3], reverse=True)[:5]
+        print(f"{len(recording.ticks)} ticks, slowest recorded frames: "
+              + ", ".join(f"tick {i} ({recording.ticks[i][3]} ms)" for i in slowest))
+        if mismatch is None:
+            print("Replay matched every tick")
+        else:
+            print(f"Replay diverged at tick {mismatch}")
+            raise SystemExit(1)
+    else:
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+        recording = SessionRecording(seed) if args.record else None
+        seed_rng(seed)
+        window = init_display()
+        main(window, recording, args.fps)
+        if recording is not None:
+            recording.save(args.record)
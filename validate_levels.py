@@ -0,0 +1,223 @@
+"""Check that every level can be played through.
+
+For each level, searches the positions the player can reach from the
+spawn with the game's own physics, and reports whether the level exit,
+every fruit and every checkpoint is among them, and whether anything
+spawns inside a block. Levels are checked in parallel, one per process:
+
+    python validate_levels.py
+    python validate_levels.py 2 3 --collision tiles --json report.json
+"""
+import os
+import sys
+import json
+import heapq
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# Simulate without a window or audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+import tutorial
+from tutorial import (World, GameState, Player, Block, Fruit, Checkpoint, LevelExit, LevelObjects,
+                      LevelFormatError, ProjectileStore, build_level, collide_mask, level_count,
+                      load_level, nearby, PLAYER_VEL)
+
+# Held direction (left, right) during a maneuver
+MOVES = [(False, False), (True, False), (False, True)]
+# Keys pressed during a maneuver, as (tick, key): walk, jump, dash, double
+# jumps and jump-dashes at a few delays
+PLANS = ([(), ((0, "jump"),), ((0, "dash"),)] +
+         [((0, "jump"), (delay, "jump")) for delay in (10, 20)] +
+         [((0, "jump"), (delay, "dash")) for delay in (10, 20)])
+# Every maneuver lasts at least this many ticks
+MIN_TICKS = 12
+# A maneuver still in the air after this many ticks is abandoned
+MAX_TICKS = 240
+# Settled player states closer than this many pixels (and otherwise
+# alike) count as one search node
+KEY_PIXELS = 32
+# Give up on a level after visiting this many search nodes
+MAX_NODES = 50000
+
+# Everything Player.loop and handle_move read or write, besides rect
+PLAYER_FIELDS = ("x_vel", "y_vel", "direction", "animation_count", "fall_count", "jump_count",
+                 "hit", "hit_count", "dash_cooldown", "wall_slide", "wall_jump_cooldown",
+                 "sprite", "mask")
+# What must be reachable, by report key
+TARGET_TYPES = {"exit": LevelExit, "fruit": Fruit, "checkpoint": Checkpoint}
+
+def snapshot(player):
+    return tuple(player.rect), tuple(getattr(player, field) for field in PLAYER_FIELDS)
+
+def restore(player, state):
+    rect, values = state
+    player.rect = pygame.Rect(rect)
+    for field, value in zip(PLAYER_FIELDS, values):
+        setattr(player, field, value)
+
+def search_key(player):
+    """Coarse summary of a player state; states with equal keys are explored once."""
+    return (player.rect.x // KEY_PIXELS, player.rect.y // KEY_PIXELS, round(player.x_vel / PLAYER_VEL),
+            player.dash_cooldown <= 0, player.wall_slide, player.direction)
+
+def settled(player):
+    """Standing on something, or sliding down a wall: where the next maneuver starts."""
+    return (player.y_vel == 0 and player.jump_count == 0) or player.wall_slide
+
+def describe(obj):
+    return f"{obj.name} at ({obj.rect.x}, {obj.rect.y})"
+
+def spawn_overlaps(objects, player):
+    """Problems for objects, and the player at the spawn, overlapping a Block."""
+    problems = []
+    for obj in [player] + [obj for obj in objects if not isinstance(obj, Block)]:
+        for block in nearby(objects, obj):
+            if isinstance(block, Block) and collide_mask(obj, block):
+                what = "player spawn" if obj is player else describe(obj)
+                problems.append(f"{what} is inside the block at ({block.rect.x}, {block.rect.y})")
+                break
+    return problems
+
+def maneuver(world, targets, reached, ticks, move, plan):
+    """Play one maneuver from the current player state with World.tick.
+
+    Records the targets touched on the way in reached and returns the
+    ticks elapsed once the player has settled again, or None if it fell
+    off the world or never settled.
+    """
+    player, game_state = world.player, world.game_state
+    left, right = move
+    presses = dict(plan)
+    last_press = max(presses, default=0)
+    game_state.health = game_state.max_health
+    for tick in range(MAX_TICKS):
+        key = presses.get(tick)
+        world.tick(left, right, key == "jump", key == "dash")
+        if game_state.health < game_state.max_health:
+            return None  # Fell off the world and respawned
+        for target in nearby(targets, player):
+            if target not in reached and collide_mask(player, target):
+                reached[target] = ticks + tick + 1
+        if tick + 1 >= MIN_TICKS and tick >= last_press and settled(player):
+            # Standing still waits for the dash to recharge and the player to stop
+            if plan or left or right or (player.dash_cooldown <= 0 and player.x_vel == 0):
+                return ticks + tick + 1
+    return None
+
+def distance_to_go(player, targets, reached):
+    """Pixels from player to the nearest target not touched yet."""
+    x, y = player.rect.center
+    return min((abs(target.rect.centerx - x) + abs(target.rect.centery - y)
+                for target in targets if target not in reached), default=0)
+
+def explore(world, targets):
+    """Search the settled player states reachable from the spawn.
+
+    Each edge is a maneuver: one direction held while the keys of a plan
+    are pressed, played tick by tick through World.step. Nodes nearest an
+    untouched target are expanded first, and the search ends once every
+    target has been touched, so a target is only reported unreachable
+    after every node has been expanded. Returns the ticks into the found
+    path at which each target was first touched, the nodes visited and
+    whether the search stopped at MAX_NODES.
+    """
+    player = world.player
+    queue = [(0, 0, snapshot(player), 0)]
+    seen = {search_key(player)}
+    reached = {}
+    while queue and len(reached) < len(targets):
+        if len(seen) >= MAX_NODES:
+            return reached, len(seen), True
+        _, _, state, ticks = heapq.heappop(queue)
+        for move in MOVES:
+            for plan in PLANS:
+                restore(player, state)
+                elapsed = maneuver(world, targets, reached, ticks, move, plan)
+                if elapsed is None:
+                    continue
+                key = search_key(player)
+                if key not in seen:
+                    seen.add(key)
+                    heapq.heappush(queue, (distance_to_go(player, targets, reached), len(seen),
+                                           snapshot(player), elapsed))
+    return reached, len(seen), False
+
+def validate_level(level_num, collision=World.collision):
+    """Report for one level as a dict; runs in a worker process."""
+    report = {"level": level_num, "problems": []}
+    try:
+        level = load_level(level_num)
+    except LevelFormatError as e:
+        report["problems"].append(str(e))
+        return report
+
+    tutorial.init_display()
+    objects = build_level(level, streaming=False)
+    world = World()
+    world.collision = collision
+    world.game_state.state = GameState.PLAYING
+    # Only terrain takes part in the search; hazards and pickups are targets or ignored
+    world.objects = LevelObjects([obj for obj in objects if isinstance(obj, Block)],
+                                 level.block_size, level.spawn)
+    world.projectiles = ProjectileStore()
+    world.player = Player(*level.spawn, 50, 50)
+    # One tick settles the player's sprite and mask before anything is compared
+    world.tick()
+
+    report["problems"] += spawn_overlaps(objects, world.player)
+    targets = LevelObjects([obj for obj in objects if isinstance(obj, tuple(TARGET_TYPES.values()))],
+                           level.block_size)
+    reached, nodes, truncated = explore(world, targets)
+
+    report["nodes"] = nodes
+    report["truncated"] = truncated
+    exit_ticks = [ticks for target, ticks in reached.items() if isinstance(target, LevelExit)]
+    report["exit_ticks"] = min(exit_ticks) if exit_ticks else None
+    for name, kind in TARGET_TYPES.items():
+        found = [target for target in targets if isinstance(target, kind)]
+        missed = [target for target in found if target not in reached]
+        report[name] = {"total": len(found), "reachable": len(found) - len(missed)}
+        report["problems"] += [f"{describe(target)} is unreachable" for target in missed]
+    if truncated:
+        report["problems"].append(f"search stopped after {nodes} states")
+    return report
+
+def format_report(report):
+    status = "FAIL" if report["problems"] else "ok"
+    lines = [f"level {report['level']}: {status}"]
+    if "nodes" in report:
+        exit_ticks = report["exit_ticks"]
+        reach = "exit unreachable" if exit_ticks is None else f"exit after {exit_ticks} ticks"
+        counts = ", ".join(f"{report[name]['reachable']}/{report[name]['total']} {name}"
+                           for name in ("fruit", "checkpoint"))
+        lines[0] += f" ({reach}; {counts}; {report['nodes']} states)"
+    lines += [f"  - {problem}" for problem in report["problems"]]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("levels", type=int, nargs="*", help="level numbers (default: all)")
+    parser.add_argument("--collision", choices=["mask", "tiles"], default=World.collision,
+                        help="terrain collision mode to search with")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--json", metavar="PATH", help="also write the reports here as JSON")
+    args = parser.parse_args()
+
+    levels = args.levels or list(range(1, level_count() + 1))
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        reports = list(pool.map(validate_level, levels, [args.collision] * len(levels)))
+
+    for report in reports:
+        print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+            f.write("\n")
+    return 1 if any(report["problems"] for report in reports) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())